@@ -62,7 +62,10 @@ BUILD_RPC(writeHBridgeOutputs, "coil_a, coil_b", "");
 MAXL maxl;
 
 // maxl's api... or should we just make it a port ? 
+uint8_t maxlIntervalBits = 0;
+
 void maxl_setInterval(uint8_t interval){
+  maxlIntervalBits = interval;
   maxl.setInterval(interval);
 }
 
@@ -71,6 +74,20 @@ void maxl_addControlPoint(uint64_t timestamp, float pt, uint8_t flags){
   maxl.addControlPoint(timestamp, fxp32_16_fromFloat(pt), _flags);
 }
 
+// batched variant: `count` consecutive pts, one interval apart, starting at `timestamp`, 
+// flags apply to the first pt only, and unused slots are ignored 
+// (rpc args max out at 8, so that's five pts per call) 
+#define MAXL_BATCH_MAX_POINTS 5
+
+void maxl_addControlPoints(uint64_t timestamp, uint8_t count, uint8_t flags, float p0, float p1, float p2, float p3, float p4){
+  float pts[MAXL_BATCH_MAX_POINTS] = { p0, p1, p2, p3, p4 };
+  if(count > MAXL_BATCH_MAX_POINTS) count = MAXL_BATCH_MAX_POINTS;
+  for(uint8_t i = 0; i < count; i ++){
+    maxlFlags_t _flags = { .byte = (i == 0) ? flags : (uint8_t)0 };
+    maxl.addControlPoint(timestamp + ((uint64_t)i << maxlIntervalBits), fxp32_16_fromFloat(pts[i]), _flags);
+  }
+}
+
 auto maxl_getPosition(void){
   return std::make_tuple(osap.getSystemMicroseconds(), maxl.getPosition());
 }
@@ -81,6 +98,7 @@ String maxl_getErrorMessage(void){
 
 BUILD_RPC(maxl_setInterval, "intervalNumBits", "");
 BUILD_RPC(maxl_addControlPoint, "time, point, flags", "");
+BUILD_RPC(maxl_addControlPoints, "time, count, flags, p0, p1, p2, p3, p4", "");
 BUILD_RPC(maxl_getErrorMessage, "", "");
 
 BUILD_RPC(maxl_getPosition, "", "time, position");
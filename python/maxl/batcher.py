@@ -0,0 +1,51 @@
+import numpy as np 
+import numpy.typing as npt 
+
+from .history import MAXLControlPointHistory 
+
+# collects not-yet-transmitted control points into runs that can be shipped 
+# in one rpc per actuator, rather than one rpc per point per actuator... 
+# a run is released when it is full, or when its oldest point has been waiting 
+# for `deadline_us` (which eats into the twin-to-real gap, so keep it short) 
+class MAXLTransmitBatcher:
+    def __init__(self, batch_size: int, deadline_us: int, twin_to_real_gap_us: int):
+        if batch_size < 1:
+            raise ValueError(f"MAXL transmit batch size should be >= 1, not {batch_size}")
+        self.batch_size = batch_size 
+        self.deadline_us = deadline_us 
+        self.twin_to_real_gap_us = twin_to_real_gap_us 
+
+    # returns the logical indices of a run to transmit now, or None if we should keep waiting 
+    def take(self, history: MAXLControlPointHistory, now: int) -> npt.NDArray | None:
+        # pending pts are always the newest in history, so runs are consecutive, 
+        start = history.pending_start()
+        count = min(len(history) - start, self.batch_size)
+        if count == 0:
+            return None 
+
+        run = np.arange(start, start + count)
+
+        # but flagged points (i.e. stream-start) have to lead their own run, 
+        # since the batched rpc only carries flags for its first pt 
+        _, _, _, flags = history.gather(run)
+        flagged = np.flatnonzero(flags[1:] != 0)
+        if len(flagged) > 0:
+            return run[:flagged[0] + 1]
+
+        if len(run) >= self.batch_size:
+            return run 
+
+        # pts are minted one gap ahead of the real machine, so we can tell how 
+        # long the oldest of 'em has been sitting here from its timestamp 
+        oldest_time = history.time_at(int(run[0]))
+        if oldest_time - now <= self.twin_to_real_gap_us - self.deadline_us:
+            return run 
+
+        return None
+
+    # when the oldest held-back pt hits its deadline (so the main loop can sleep until then), 
+    # or None if there is nothing pending 
+    def next_release_time_us(self, history: MAXLControlPointHistory) -> int | None:
+        if history.pending_count() == 0:
+            return None 
+        return history.time_at(history.pending_start()) - (self.twin_to_real_gap_us - self.deadline_us)
@@ -1,52 +1,24 @@
 import asyncio 
 import traceback 
 from asyncio import Task 
-from collections import deque 
 from dataclasses import dataclass 
-from typing import List, Callable, Deque, TYPE_CHECKING
+from typing import List, Callable, Tuple, TYPE_CHECKING
 
 import numpy as np 
 import numpy.typing as npt 
 
-from .types import MAXLControlPoint, MAXLInterpolationIntervals, MAXLStates
+from .types import MAXLInterpolationIntervals, MAXLStates
 from .queue_planner import MAXLQueuePlanner
+from .history import MAXLControlPointHistory
+from .batcher import MAXLTransmitBatcher
+from .telemetry import MAXLTelemetry
+from .dry_run import MAXLVirtualClock
 
 from modules.maxl_stepper import MAXLStepper 
 
 if TYPE_CHECKING:
     from ..osap.osap import OSAP 
 
-# returns [pos, vel, acc, jerk]
-def get_states_from_spline_pts(p0, p1, p2, p3, t1, t_now, t_interval_length):
-    # time as 0...1 in the interval, 
-    t = (t_now - t1) / t_interval_length
-    # double, triple, 
-    tt = np.power(t, 2) 
-    ttt = np.power(t, 3) 
-    # conform as np 
-    p0 = np.array(p0)
-    p1 = np.array(p1)
-    p2 = np.array(p2)
-    p3 = np.array(p3)
-    # params, 
-    a = 1/6 * p0 + 2/3 * p1 + 1/6 * p2 
-    b = - 1/2 * p0 + 1/2 * p2 
-    c = 1/2 * p0 - p1 + 1/2 * p2 
-    d = - 1/6 * p0 + 1/2 * p1 - 1/2 * p2 + 1/6 * p3 
-
-    # now we can get 'em all w/ 
-    pos  = a + b * t + c * tt + d * ttt
-    vel  = (b + c * 2 * t + d * 3 * tt) * (1000000 / t_interval_length)
-    acc  = (c * 2 + d * 6 * t) #TODO ?? * (1000000 / t_interval_length)
-    jerk = (d * 6) # * (1000000 / t_interval_length)
-
-    return [
-        pos, 
-        vel, 
-        acc, 
-        jerk
-    ]
-    
 MAXL_REMOTE_BUFFER_SIZE = 128
 MAXL_RESPONSIBLE_GAP_MAXIMUM = MAXL_REMOTE_BUFFER_SIZE - 6
 MAXL_RESPONSIBLE_GAP_MINIMUM = 8
@@ -60,6 +32,17 @@ class MAXLCoreConfig:
     actuator_currents: List[float]
     graph: Callable[[int], npt.NDArray]
     print_point_transmits: bool = False 
+    # optional batch-mode graph: an array of K times in, (K, axes) and (K, actuators) pts out, 
+    # used to mint `generation_batch_size` pts per pass (which then run up to K - 1 intervals past the gap) 
+    graph_many: Callable[[npt.NDArray], Tuple[npt.NDArray, npt.NDArray]] | None = None 
+    generation_batch_size: int = 1 
+    # pts per add-control-points rpc (where actuators support it), and the longest 
+    # a pending pt should wait for its batch to fill before we ship it anyways 
+    transmit_batch_size: int = 1 
+    transmit_batch_deadline_ms: int = 0 
+    # while pt-gen runs late, replans get this long (in us) each, and finish the rest of the queue 
+    # once we've caught up... None suppresses replanning (and so new moves) outright instead 
+    sluggish_replan_budget_us: int | None = 500 
 
 
 class MAXLCore:
@@ -67,6 +50,8 @@ class MAXLCore:
         self.osap = osap 
 
         self.system_graph = config.graph 
+        self.system_graph_many = config.graph_many 
+        self.generation_batch_size = config.generation_batch_size if config.graph_many is not None else 1 
 
         # a hookup - maybe temporary (or invertible) to do 
         # blockage on recalculating (for sluggishness conditions) 
@@ -94,6 +79,12 @@ class MAXLCore:
                 f"{MAXL_RESPONSIBLE_GAP_MAXIMUM * self.interpolation_interval_us}"
             )
 
+        if num_ctrl_pts_in_time_gap + self.generation_batch_size - 1 > MAXL_RESPONSIBLE_GAP_MAXIMUM:
+            raise Exception(
+                f"generating {self.generation_batch_size} pts per pass on top of a gap of {num_ctrl_pts_in_time_gap} pts "
+                f"will result in overfull buffers... please decrease the generation batch size or the gap"
+            )
+
         if num_ctrl_pts_in_time_gap < MAXL_RESPONSIBLE_GAP_MINIMUM:
             raise Exception(
                 f"with a gap of {self.twin_to_real_gap_us} and an interval of {self.interpolation_interval_us}, "
@@ -101,13 +92,42 @@ class MAXLCore:
                 f"{MAXL_RESPONSIBLE_GAP_MINIMUM * self.interpolation_interval_us}"
             )
 
-        self.control_points: Deque[MAXLControlPoint] = deque(maxlen = num_ctrl_pts_in_time_gap + num_ctrl_pts_in_history + 100)
+        self.control_points = MAXLControlPointHistory(
+            num_ctrl_pts_in_time_gap + num_ctrl_pts_in_history + self.generation_batch_size + 100, 
+            self.interpolation_interval_us, 
+            len(self.queue_planner.axes), 
+            len(self.actuators)
+        )
+        if config.transmit_batch_deadline_ms * 1000 > self.twin_to_real_gap_us / 2:
+            raise Exception(
+                f"a transmit batch deadline of {config.transmit_batch_deadline_ms}ms eats too much of the "
+                f"{config.twin_to_real_gap_ms}ms twin-to-real gap, please keep it under half of the gap"
+            )
+        self.telemetry = MAXLTelemetry(
+            [actuator.device_name for actuator in self.actuators if actuator is not None],
+            MAXL_REMOTE_BUFFER_SIZE
+        )
+        self._batcher = MAXLTransmitBatcher(config.transmit_batch_size, config.transmit_batch_deadline_ms * 1000, self.twin_to_real_gap_us)
+
         self.main_loop_task: Task | None = None 
         self._run_main_loop = False 
-        self._actuator_polling_interval_us = 1000000
-        self._actuator_polling_last_time = 0 
+
+        # actuator error polling runs in its own task, at lower priority than pt-gen / tx:
+        # it only fires while the main loop is asleep, and it backs off (doubling its
+        # interval up to the max) while the main loop is carrying a backlog
+        self.actuator_polling_task: Task | None = None 
+        self._actuator_polling_base_interval_us = 1000000
+        self._actuator_polling_max_interval_us = 8000000
+        self._actuator_polling_interval_us = self._actuator_polling_base_interval_us
+        self._main_loop_idle = asyncio.Event()
 
         self._do_unsafe_recalculations = False 
+        self.sluggish_replan_budget_us = config.sluggish_replan_budget_us 
+
+        # the main loop sleeps until its next deadline, but asyncio timers round to ~1ms, 
+        # so we aim to wake this much early and yield-spin the remainder 
+        # (on a dry run's virtual clock, time only moves while we sleep, so we can't spin) 
+        self._wake_early_us = 0 if isinstance(osap, MAXLVirtualClock) else 1000 
 
 
     async def begin(self):
@@ -121,12 +141,11 @@ class MAXLCore:
                 if isinstance(actuator, MAXLStepper):
                     await actuator.set_current_scale(self.actuator_currents[a])
 
-        self.control_points.append(MAXLControlPoint(np.zeros(len(self.queue_planner.axes)), np.zeros(len(self.actuators)), now + self.twin_to_real_gap_us, 1))
-
-        self._actuator_polling_last_time = now 
+        self.control_points.append(np.zeros(len(self.queue_planner.axes)), np.zeros(len(self.actuators)), now + self.twin_to_real_gap_us, 1)
 
         self._run_main_loop = True 
         self.main_loop_task = asyncio.create_task(self.main_loop())
+        self.actuator_polling_task = asyncio.create_task(self.actuator_polling_loop())
 
 
     async def shutdown(self):
@@ -136,6 +155,12 @@ class MAXLCore:
             await self.main_loop_task
         except BaseException:
             pass
+        if self.actuator_polling_task is not None:
+            self.actuator_polling_task.cancel()
+            try:
+                await self.actuator_polling_task
+            except BaseException:
+                pass
         for a, actuator in enumerate(self.actuators):
             if actuator is not None:
                 print(f"MAXL: attempting shutdown of {actuator.device_name} ...")
@@ -156,62 +181,60 @@ class MAXLCore:
                     print("MAXL: ... loop exit")
                     return 
                 
+                self._main_loop_idle.clear()
                 now = self.osap.get_system_microseconds()
 
                 # check / generate new (future) control points, 
-                if (self.control_points[-1].time + self.interpolation_interval_us) < (now + self.twin_to_real_gap_us):
-                    sluggishness_gap = (now + self.twin_to_real_gap_us) - (self.control_points[-1].time + self.interpolation_interval_us * 2)
+                last_time = self.control_points.time_at(-1)
+                if (last_time + self.interpolation_interval_us) < (now + self.twin_to_real_gap_us):
+                    sluggishness_gap = (now + self.twin_to_real_gap_us) - (last_time + self.interpolation_interval_us * 2)
+                    self.telemetry.record_generation_lag(now, sluggishness_gap)
                     if sluggishness_gap > 10000:
                         # print(f"MAXL: WARNING: pt gen is sluggish by {sluggishness_gap}us")
                         if not self._do_unsafe_recalculations:
-                            self.queue_planner.do_recalculations = False 
+                            if self.sluggish_replan_budget_us is not None:
+                                if self.queue_planner.replan_budget_us is None:
+                                    self.telemetry.post_event(now, "replan_budgeted", "maxl", f"pt gen is sluggish by {sluggishness_gap}us")
+                                self.queue_planner.replan_budget_us = self.sluggish_replan_budget_us 
+                            else:
+                                if self.queue_planner.do_recalculations:
+                                    self.telemetry.post_event(now, "replan_suppressed", "maxl", f"pt gen is sluggish by {sluggishness_gap}us")
+                                self.queue_planner.do_recalculations = False 
                     else:
                         self.queue_planner.do_recalculations = True 
-                    previous_point = self.control_points[-1]
-                    time = previous_point.time + self.interpolation_interval_us 
-
-                    # use ... a buncha transforms to make actuator points, 
-                    next_cartesian, next_actuators = self.system_graph(time)
-                    self.control_points.append(MAXLControlPoint(next_cartesian, next_actuators, time, 0))
-
-                # check / transmit points, 
-                for pt in self.control_points:
-                    if pt.tx_time == 0:
-                        if self.print_point_transmits:
-                            print(f"MAXL: TX point to {[f"{x:.5f}" for x in pt.position_actuator]} for {pt.time} w/ flag {pt.flags}")
-                        tasks = [] 
-                        for a, actuator in enumerate(self.actuators):
-                            if actuator is not None:
-                                if pt.position_actuator[a] > 16000 or pt.position_actuator[a] < -16000:
-                                    print(f"MAXL: WARNING: you are getting close to wrapping fxp16_16 * 1.5625 w/ \
-                                          {pt.position_actuator[a]:.3f} ... time to finish that project !")
-                                tasks.append(actuator.maxl_add_control_point(pt.time, pt.position_actuator[a], pt.flags))
-                        pt.tx_time = now
-                        self.control_point_most_recent_tx = pt 
-                        await asyncio.gather(*tasks) 
-
-                # rm historical control pts, 
-                if self.control_points[0].time < now - self.history_length_us:
-                    old_pt = self.control_points.popleft()
-                    # print(F"popped to len {len(self.control_points)}, times: {old_pt.time} at {now}")
-
-                # check for error msgs from actuators 
-                if self._actuator_polling_last_time + self._actuator_polling_interval_us < now:
-                    self._actuator_polling_last_time = now 
-                    tasks = [] 
-                    real_actuators = [] 
-                    for actuator in self.actuators:
-                        if actuator is not None:
-                            tasks.append(actuator.maxl_get_error_message())
-                            real_actuators.append(actuator)
-
-                    messages = await asyncio.gather(*tasks)
-                    for actuator, message in zip(real_actuators, messages):
-                        if message:
-                            print(f"{actuator.device_name}: {message}")
-
-                # else carry on... 
-                await asyncio.sleep(0)
+                        self.queue_planner.replan_budget_us = None 
+                    if self.generation_batch_size > 1:
+                        # mint the next K pts in one vectorized pass, 
+                        times = last_time + self.interpolation_interval_us * np.arange(1, self.generation_batch_size + 1)
+                        next_cartesians, next_actuators = self.system_graph_many(times)
+                        self.control_points.extend(next_cartesians, next_actuators, times, 0)
+                    else:
+                        time = last_time + self.interpolation_interval_us 
+
+                        # use ... a buncha transforms to make actuator points, 
+                        next_cartesian, next_actuators = self.system_graph(time)
+                        self.control_points.append(next_cartesian, next_actuators, time, 0)
+
+                # check / transmit points, in batches where the actuators can take 'em 
+                while True:
+                    batch = self._batcher.take(self.control_points, now)
+                    if batch is None:
+                        break 
+                    self.control_points.set_tx_times(batch, now)
+                    self.control_point_most_recent_tx = self.control_points[batch[-1]]
+                    await self._transmit_points(batch)
+
+                # rm historical control pts, (never anything that's still waiting to go out) 
+                expired = self.control_points.count_before_us(now - self.history_length_us)
+                if expired > 0:
+                    self.control_points.discard(min(expired, self.control_points.pending_start(), len(self.control_points) - 1))
+
+                # else carry on... sleeping until the next thing we have to do, 
+                # rather than spinning, 
+                now = self.osap.get_system_microseconds()
+                wait_us = self._next_action_time_us() - now 
+                self._main_loop_idle.set()
+                await asyncio.sleep(max(0, wait_us - self._wake_early_us) / 1000000)
 
             except Exception as err:
                 print(err)         
@@ -220,38 +243,86 @@ class MAXLCore:
 
         # end main_loop
 
-    # returns a tuple of cartesian_states, actuator_states, with t[0] = posns ... t[3] = jerk 
-    def get_states_at_us(self, time_us: int):
-        # index of the *most recently passed* control point, 
-        index = next((i for i, pt in enumerate(self.control_points) if (pt.time < time_us and time_us < (pt.time + self.interpolation_interval_us))), None)
-        if index is None:
-            oldest_pt_time = self.control_points[0].time
-            newest_pt_time = self.control_points[-1].time
-            raise Exception(F"MAXL couldn't find any control points around {time_us}, history spans {oldest_pt_time} ... {newest_pt_time}")
-        
-        if index < 0 or (index + 2) > len(self.control_points):
-            oldest_pt_time = self.control_points[0].time
-            newest_pt_time = self.control_points[-1].time
-            raise Exception(F"MAXL doesn't have enough local history around {time_us} to resolve states, history spans {oldest_pt_time} ... {newest_pt_time}, {index} of {len(self.control_points)}")
-
-        local_cartesian_pts = [
-            self.control_points[index - 1].position_cartesian,
-            self.control_points[index].position_cartesian,
-            self.control_points[index + 1].position_cartesian,
-            self.control_points[index + 2].position_cartesian
-        ]
+    # polls actuators for error msgs, publishing them as telemetry events 
+    async def actuator_polling_loop(self):
+        actuators = [actuator for actuator in self.actuators if actuator is not None]
+        while self._run_main_loop:
+            await asyncio.sleep(self._actuator_polling_interval_us / 1000000)
+
+            # back off while pt-gen / tx are behind, and recover once they've caught up, 
+            if self._has_backlog():
+                self._actuator_polling_interval_us = min(self._actuator_polling_interval_us * 2, self._actuator_polling_max_interval_us)
+                continue 
+            self._actuator_polling_interval_us = self._actuator_polling_base_interval_us
+
+            # only go while the main loop is asleep, so that our rpcs queue behind its own, 
+            await self._main_loop_idle.wait()
+            results = await asyncio.gather(
+                *[actuator.maxl_get_error_message() for actuator in actuators],
+                return_exceptions = True
+            )
 
-        local_actuator_pts = [
-            self.control_points[index - 1].position_actuator,
-            self.control_points[index].position_actuator,
-            self.control_points[index + 1].position_actuator,
-            self.control_points[index + 2].position_actuator
+            now = self.osap.get_system_microseconds()
+            for actuator, result in zip(actuators, results):
+                if isinstance(result, BaseException):
+                    self.telemetry.post_event(now, "actuator_poll_failed", actuator.device_name, repr(result))
+                elif result:
+                    self.telemetry.post_event(now, "actuator_error", actuator.device_name, result)
+
+    # true when the main loop has untransmitted pts stacking up, or when pt-gen is running late 
+    def _has_backlog(self) -> bool:
+        if self.control_points.pending_count() > self._batcher.batch_size:
+            return True 
+        lag = self.telemetry.generation_lag_series.last()
+        return lag is not None and lag > 0 
+
+    # the soonest time at which the main loop has work: each check in the loop is a 
+    # strict `<` on its own timer, so we aim one us past the earliest of 'em 
+    def _next_action_time_us(self) -> int:
+        deadlines = [
+            # the next pt-gen, 
+            self.control_points.time_at(-1) + self.interpolation_interval_us - self.twin_to_real_gap_us,
+            # and the next history trim, 
+            self.control_points.time_at(0) + self.history_length_us,
         ]
+        # pts that the batcher is holding back, 
+        release = self._batcher.next_release_time_us(self.control_points)
+        if release is not None:
+            deadlines.append(release)
+        return min(deadlines) + 1 
+
+    async def _transmit_points(self, indices: npt.NDArray):
+        times, _, positions, flags = self.control_points.gather(indices)
+        if self.print_point_transmits:
+            for t, pos, flag in zip(times, positions, flags):
+                print(f"MAXL: TX point to {[f"{x:.5f}" for x in pos]} for {t} w/ flag {flag}")
+        if np.any(np.abs(positions) > 16000):
+            print(f"MAXL: WARNING: you are getting close to wrapping fxp16_16 * 1.5625 w/ \
+                  {np.max(np.abs(positions)):.3f} ... time to finish that project !")
+
+        self.telemetry.record_tx(self.osap.get_system_microseconds(), times, self.interpolation_interval_us)
+
+        tasks = [] 
+        for a, actuator in enumerate(self.actuators):
+            if actuator is not None:
+                tasks.append(self._transmit_to_actuator(actuator, times, positions[:, a], flags))
+        await asyncio.gather(*tasks)
+
+    # pts are consecutive, and only the first can carry flags (see MAXLTransmitBatcher) 
+    async def _transmit_to_actuator(self, actuator, times: npt.NDArray, positions: npt.NDArray, flags: npt.NDArray):
+        batch_size = getattr(actuator, "maxl_batch_size", 1)
+        if batch_size > 1 and len(times) > 1:
+            for c in range(0, len(times), batch_size):
+                rpc_start = self.osap.get_system_microseconds()
+                await actuator.maxl_add_control_points(int(times[c]), positions[c:c + batch_size].tolist(), int(flags[c]))
+                self.telemetry.record_rpc_latency(actuator.device_name, self.osap.get_system_microseconds() - rpc_start)
+        else:
+            for t, pos, flag in zip(times, positions, flags):
+                rpc_start = self.osap.get_system_microseconds()
+                await actuator.maxl_add_control_point(int(t), float(pos), int(flag))
+                self.telemetry.record_rpc_latency(actuator.device_name, self.osap.get_system_microseconds() - rpc_start)
 
-        t1 = self.control_points[index].time
-
-        return (
-            get_states_from_spline_pts(*local_cartesian_pts, t1, time_us, self.interpolation_interval_us), 
-            get_states_from_spline_pts(*local_actuator_pts, t1, time_us, self.interpolation_interval_us)
-        )
-
+    # returns a tuple of cartesian_states, actuator_states, with t[0] = posns ... t[3] = jerk 
+    # time_us can also be an array of times, in which case each state is stacked (len(time_us), dof)
+    def get_states_at_us(self, time_us: int | npt.ArrayLike):
+        return self.control_points.get_states_at_us(time_us)
@@ -0,0 +1,120 @@
+import asyncio
+import selectors
+import time
+from typing import Any, Awaitable, Callable, Dict, TypeVar, TYPE_CHECKING
+
+import numpy as np
+import numpy.typing as npt
+
+if TYPE_CHECKING:
+    from .core import MAXLCore
+
+T = TypeVar("T")
+
+# dry-runs put the whole motion stack (MAXLCore, MAXLQueuePlanner, a machine) on a
+# virtual clock, with simulated actuators instead of hardware:
+# the clock only moves when every task is asleep, and then it jumps straight to
+# the next timer, so a job replays as fast as the CPU can generate its pts,
+# and the virtual time it takes is the time it would take on the machine
+
+
+# stands in for an OSAP wherever MAXL only wants the time,
+class MAXLVirtualClock:
+    def __init__(self, start_us: int = 0):
+        self.now_us = start_us
+
+    def get_system_microseconds(self) -> int:
+        return self.now_us
+
+    def advance_us(self, delta_us: int):
+        self.now_us += delta_us
+
+
+# where the event loop would block on i/o until its next timer, we fast-forward to it instead
+class _MAXLVirtualSelector(selectors.SelectSelector):
+    def __init__(self, clock: MAXLVirtualClock):
+        super().__init__()
+        self._clock = clock
+
+    def select(self, timeout: float | None = None):
+        if timeout is None:
+            raise Exception("MAXL dry run has stalled: every task is waiting, and nothing is scheduled to wake them")
+        if timeout > 0:
+            self._clock.advance_us(int(np.ceil(timeout * 1000000)))
+        return super().select(0)
+
+
+class MAXLDryRunEventLoop(asyncio.SelectorEventLoop):
+    def __init__(self, clock: MAXLVirtualClock):
+        self.clock = clock
+        super().__init__(_MAXLVirtualSelector(clock))
+
+    def time(self) -> float:
+        return self.clock.now_us / 1000000
+
+
+# runs main(clock) to completion on a fresh virtual-time loop,
+# (blocking, so from inside another loop use i.e. asyncio.to_thread(run_dry, main))
+def run_dry(main: Callable[[MAXLVirtualClock], Awaitable[T]], start_us: int = 0) -> T:
+    clock = MAXLVirtualClock(start_us)
+    loop = MAXLDryRunEventLoop(clock)
+    try:
+        return loop.run_until_complete(main(clock))
+    finally:
+        loop.close()
+
+
+# the clock of the dry run we're in, for code that sets itself up from inside one
+def get_virtual_clock() -> MAXLVirtualClock:
+    loop = asyncio.get_running_loop()
+    if not isinstance(loop, MAXLDryRunEventLoop):
+        raise Exception("MAXL dry runs have to be run w/ maxl.dry_run.run_dry(), not on a regular event loop")
+    return loop.clock
+
+
+# ----------------------------------------------------- results
+
+# the pts each (simulated, recording) actuator accepted, as (n, 2) arrays of [time, position]
+def get_dry_run_streams(core: "MAXLCore") -> Dict[str, npt.NDArray]:
+    streams = {}
+    for actuator in core.actuators:
+        if actuator is not None and getattr(actuator, "record_stream", False):
+            streams[actuator.device_name] = np.array(actuator.stream, dtype = np.float64).reshape(-1, 2)
+    return streams
+
+
+# timing stats for a dry run that started at (virtual) start_us, and (real) perf_counter() start_s
+def get_dry_run_report(core: "MAXLCore", start_us: int, start_s: float) -> Dict[str, Any]:
+    job_time_s = (core.osap.get_system_microseconds() - start_us) / 1000000
+    real_time_s = time.perf_counter() - start_s
+
+    actuators = {}
+    for actuator in core.actuators:
+        if actuator is not None:
+            actuators[actuator.device_name] = {
+                "rpcs": getattr(actuator, "rpc_count", None),
+                "points": getattr(actuator, "points_received", None),
+                "errors": [err for err in getattr(actuator, "errors", []) if err != "startup"],
+            }
+
+    planner = core.queue_planner
+    return {
+        "job_time_s": job_time_s,
+        "real_time_s": real_time_s,
+        "speedup": job_time_s / real_time_s if real_time_s > 0 else None,
+        "actuators": actuators,
+        # cpu cost of the planner's hot paths, in (real) us
+        "planner_us": {
+            name: {"avg": profiler.avg, "hwm": profiler.hwm}
+            for name, profiler in [
+                ("add_segment", planner._profiler_addsegment),
+                ("new_control_point", planner._profiler_newcp),
+                ("replan", planner._profiler_replan),
+            ]
+        },
+        # and w/ percentiles, per replan phase, and by queue length
+        "planner_profile": planner._get_profile_report(),
+        # moves the planner's front end merged away
+        "planner_eliminated": planner.get_eliminated_segment_counts(),
+        "telemetry": core.telemetry.summary(),
+    }
@@ -0,0 +1,273 @@
+import numpy as np
+import numpy.typing as npt
+
+from .types import MAXLControlPoint
+
+# cubic b-spline coefficients [a, b, c, d] for the interval between p1 and p2,
+# pts can be single points (dof,) or stacks of them (n, dof), coeffs are (4, dof) or (n, 4, dof)
+def get_spline_coefficients(p0, p1, p2, p3):
+    p0 = np.asarray(p0)
+    p1 = np.asarray(p1)
+    p2 = np.asarray(p2)
+    p3 = np.asarray(p3)
+    return np.stack([
+        1/6 * p0 + 2/3 * p1 + 1/6 * p2,
+        - 1/2 * p0 + 1/2 * p2,
+        1/2 * p0 - p1 + 1/2 * p2,
+        - 1/6 * p0 + 1/2 * p1 - 1/2 * p2 + 1/6 * p3,
+    ], axis = -2)
+
+# returns [pos, vel, acc, jerk] from coefficients, w/ derivatives per second
+# t is time as 0...1 in the interval, (n, 1) against (n, 4, dof) coeffs
+def evaluate_spline_coefficients(coeffs, t, t_interval_length):
+    a = coeffs[..., 0, :]
+    b = coeffs[..., 1, :]
+    c = coeffs[..., 2, :]
+    d = coeffs[..., 3, :]
+    # d/dt in seconds, where t is in intervals
+    rate = 1000000 / t_interval_length
+
+    pos  = a + t * (b + t * (c + t * d))
+    vel  = (b + t * (c * 2 + t * d * 3)) * rate
+    acc  = (c * 2 + d * 6 * t) * rate ** 2
+    jerk = (d * 6) * np.ones_like(t) * rate ** 3
+
+    return [
+        pos,
+        vel,
+        acc,
+        jerk
+    ]
+
+# returns [pos, vel, acc, jerk]
+# pts can be single points (dof,) or stacks of them (n, dof) w/ times as (n, 1)
+def get_states_from_spline_pts(p0, p1, p2, p3, t1, t_now, t_interval_length):
+    # time as 0...1 in the interval,
+    t = (t_now - t1) / t_interval_length
+    return evaluate_spline_coefficients(get_spline_coefficients(p0, p1, p2, p3), t, t_interval_length)
+
+
+# a preallocated ring of control points, stored column-wise in np arrays
+# (rather than as a deque of MAXLControlPoint objects) so that we can look up
+# states by time with index maths instead of walking the whole history,
+# logical index 0 is the oldest point we hold, len - 1 is the newest,
+class MAXLControlPointHistory:
+    def __init__(self, capacity: int, interval_us: int, cartesian_dof: int, actuator_dof: int):
+        self.capacity = capacity
+        self.interval_us = interval_us
+
+        self.times = np.zeros(capacity, dtype = np.int64)
+        self.positions_cartesian = np.zeros((capacity, cartesian_dof))
+        self.positions_actuator = np.zeros((capacity, actuator_dof))
+        self.flags = np.zeros(capacity, dtype = np.uint8)
+        self.tx_times = np.zeros(capacity, dtype = np.int64)
+
+        # spline coefficients for the interval *starting* at each point, filled lazily
+        # on lookup: a point's pts never change once written, so an interval's coeffs
+        # stay good until its own slot is overwritten
+        self.coeffs_cartesian = np.zeros((capacity, 4, cartesian_dof))
+        self.coeffs_actuator = np.zeros((capacity, 4, actuator_dof))
+        self._coeffs_valid = np.zeros(capacity, dtype = bool)
+
+        # physical index of the oldest point, and count of points held
+        self._start = 0
+        self._len = 0
+        # points are transmitted in the order they are minted, so everything from the
+        # tx cursor onwards is pending... we track it as a count of points ever appended
+        # (like _dropped, the count of points ever dropped off the front) so that it
+        # survives trimming without any bookkeeping
+        self._appended = 0
+        self._dropped = 0
+        self._tx_cursor = 0
+
+    def __len__(self):
+        return self._len
+
+    def __getitem__(self, index: int) -> MAXLControlPoint:
+        i = self._physical(index)
+        return MAXLControlPoint(
+            self.positions_cartesian[i].copy(),
+            self.positions_actuator[i].copy(),
+            int(self.times[i]),
+            int(self.flags[i]),
+            int(self.tx_times[i])
+        )
+
+    def _physical(self, index: int) -> int:
+        if index < 0:
+            index += self._len
+        if index < 0 or index >= self._len:
+            raise IndexError(f"MAXL history index {index} out of range for len {self._len}")
+        return (self._start + index) % self.capacity
+
+    # ----------------------------------------------------- ring mgmt
+
+    def append(self, position_cartesian: npt.ArrayLike, position_actuator: npt.ArrayLike, time: int, flags: int = 0):
+        # like a deque w/ maxlen, we drop the oldest when we are full
+        if self._len == self.capacity:
+            self.discard(1)
+
+        i = (self._start + self._len) % self.capacity
+        self.positions_cartesian[i] = position_cartesian
+        self.positions_actuator[i] = position_actuator
+        self.times[i] = time
+        self.flags[i] = flags
+        self.tx_times[i] = 0
+        self._coeffs_valid[i] = False
+        self._len += 1
+        self._appended += 1
+
+    # append a run of points, (n, dof) positions and (n,) times 
+    def extend(self, positions_cartesian: npt.ArrayLike, positions_actuator: npt.ArrayLike, times: npt.ArrayLike, flags: int = 0):
+        times = np.asarray(times)
+        count = len(times)
+        # only the newest `capacity` could survive anyways,
+        keep = min(count, self.capacity)
+        physical = (self._start + self._len + np.arange(count - keep, count)) % self.capacity
+        self.positions_cartesian[physical] = np.asarray(positions_cartesian)[count - keep:]
+        self.positions_actuator[physical] = np.asarray(positions_actuator)[count - keep:]
+        self.times[physical] = times[count - keep:]
+        self.flags[physical] = flags
+        self.tx_times[physical] = 0
+        self._coeffs_valid[physical] = False
+
+        # and drop the oldest to make room, like append 
+        overflow = max(0, self._len + count - self.capacity)
+        self._start = (self._start + overflow) % self.capacity
+        self._len = min(self._len + count, self.capacity)
+        self._appended += count
+        self._dropped += overflow
+
+    def popleft(self) -> MAXLControlPoint:
+        pt = self[0]
+        self.discard(1)
+        return pt
+
+    # drop the oldest `count` points, 
+    def discard(self, count: int):
+        count = min(count, self._len)
+        self._start = (self._start + count) % self.capacity
+        self._len -= count
+        self._dropped += count
+
+    # no. of points (from the oldest) whose timestamps are before `time_us`
+    def count_before_us(self, time_us: int) -> int:
+        if self._len == 0:
+            return 0
+        # ceil, on the fixed interval, 
+        count = -((self.time_at(0) - time_us) // self.interval_us)
+        return int(np.clip(count, 0, self._len))
+
+    def time_at(self, index: int) -> int:
+        return int(self.times[self._physical(index)])
+
+    def set_tx_time(self, index: int, tx_time: int):
+        self.tx_times[self._physical(index)] = tx_time
+
+    # marks a run of points as sent, which moves the tx cursor past them 
+    def set_tx_times(self, indices: npt.ArrayLike, tx_time: int):
+        indices = np.asarray(indices)
+        if indices.size == 0:
+            return
+        self.tx_times[(self._start + indices) % self.capacity] = tx_time
+        self._tx_cursor = max(self._tx_cursor, self._dropped + int(np.max(indices)) + 1)
+
+    # returns times, cartesian positions, actuator positions and flags, stacked for each index
+    def gather(self, indices: npt.ArrayLike):
+        physical = (self._start + np.asarray(indices)) % self.capacity
+        return (
+            self.times[physical],
+            self.positions_cartesian[physical],
+            self.positions_actuator[physical],
+            self.flags[physical]
+        )
+
+    # logical index of the oldest point that hasn't been transmitted yet, 
+    # (== len when there's nothing pending) 
+    def pending_start(self) -> int:
+        return int(np.clip(self._tx_cursor - self._dropped, 0, self._len))
+
+    def pending_count(self) -> int:
+        return self._len - self.pending_start()
+
+    # logical indices of points that haven't been transmitted yet
+    def pending_indices(self) -> npt.NDArray:
+        return np.arange(self.pending_start(), self._len)
+
+    # ----------------------------------------------------- lookups
+
+    # logical index of the *most recently passed* control point for each time,
+    # or -1 where the time is outside of our history
+    def index_at_us(self, times_us: npt.ArrayLike) -> npt.NDArray:
+        times_us = np.asarray(times_us, dtype = np.int64)
+        if self._len == 0:
+            return np.full(times_us.shape, -1, dtype = np.int64)
+
+        oldest = self.times[self._start]
+        # control points are minted on a fixed interval, so we can direct-index ...
+        index = (times_us - oldest) // self.interval_us
+        in_range = (times_us >= oldest) & (index < self._len)
+        index = np.where(in_range, index, -1)
+
+        # ... and we check that guess, in case the stream was ever discontinuous,
+        physical = (self._start + np.clip(index, 0, self._len - 1)) % self.capacity
+        t_pt = self.times[physical]
+        hit = in_range & (t_pt <= times_us) & (times_us < t_pt + self.interval_us)
+        if not np.all(hit[in_range]):
+            # fall back to a binary search over time-ordered history
+            ordered = self.times[(self._start + np.arange(self._len)) % self.capacity]
+            index = np.searchsorted(ordered, times_us, side = 'right') - 1
+            index = np.where((index >= 0) & (times_us < ordered[np.clip(index, 0, None)] + self.interval_us), index, -1)
+
+        return index
+
+    # returns a tuple of cartesian_states, actuator_states, with t[0] = posns ... t[3] = jerk
+    # for scalar time_us states are (dof,), for arrays of times they are (len(times), dof)
+    def get_states_at_us(self, time_us: npt.ArrayLike):
+        scalar = np.ndim(time_us) == 0
+        times = np.atleast_1d(np.asarray(time_us, dtype = np.int64))
+
+        index = self.index_at_us(times)
+        if np.any(index < 0):
+            bad = int(times[np.argmax(index < 0)])
+            raise Exception(F"MAXL couldn't find any control points around {bad}, history spans {self._span()}")
+
+        # we need one point behind, and two ahead, to resolve the cubic
+        if np.any(index < 1) or np.any(index + 2 > self._len - 1):
+            bad_i = np.argmax((index < 1) | (index + 2 > self._len - 1))
+            raise Exception(F"MAXL doesn't have enough local history around {int(times[bad_i])} to resolve states, history spans {self._span()}, {int(index[bad_i])} of {self._len}")
+
+        i1 = (self._start + index) % self.capacity
+        self._fill_coefficients(i1)
+
+        t = ((times - self.times[i1]) / self.interval_us)[:, np.newaxis]
+        cartesian = evaluate_spline_coefficients(self.coeffs_cartesian[i1], t, self.interval_us)
+        actuator = evaluate_spline_coefficients(self.coeffs_actuator[i1], t, self.interval_us)
+
+        if scalar:
+            cartesian = [state[0] for state in cartesian]
+            actuator = [state[0] for state in actuator]
+
+        return cartesian, actuator
+
+    # computes coeffs for any of these (physical) interval starts that don't have 'em yet,
+    # callers make sure there's one point behind and two ahead of each
+    def _fill_coefficients(self, i1: npt.NDArray):
+        missing = np.unique(i1[~self._coeffs_valid[i1]])
+        if len(missing) == 0:
+            return
+        i0 = (missing - 1) % self.capacity
+        i2 = (missing + 1) % self.capacity
+        i3 = (missing + 2) % self.capacity
+        self.coeffs_cartesian[missing] = get_spline_coefficients(
+            self.positions_cartesian[i0], self.positions_cartesian[missing], self.positions_cartesian[i2], self.positions_cartesian[i3]
+        )
+        self.coeffs_actuator[missing] = get_spline_coefficients(
+            self.positions_actuator[i0], self.positions_actuator[missing], self.positions_actuator[i2], self.positions_actuator[i3]
+        )
+        self._coeffs_valid[missing] = True
+
+    def _span(self) -> str:
+        if self._len == 0:
+            return "nothing"
+        return f"{self.time_at(0)} ... {self.time_at(-1)}"
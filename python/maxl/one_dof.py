@@ -1,13 +1,12 @@
 import asyncio 
 from dataclasses import dataclass 
-from collections import deque 
-from typing import Callable, Awaitable, Tuple, Deque 
+from typing import Callable, Awaitable, Tuple 
 
 import numpy as np 
 
 from .types import MAXLInterpolationIntervals
 from .queue_planner_functional import MAXLQueueSegment 
-from .core import get_states_from_spline_pts 
+from .history import MAXLControlPointHistory 
 
 @dataclass 
 class MAXLOneDOFConfig:
@@ -17,11 +16,6 @@ class MAXLOneDOFConfig:
     max_accel: float 
     max_vel: float 
 
-@dataclass 
-class MAXLOneDOFControlPoint:
-    time_us: int 
-    position: float 
-
 class MAXLOneDOF:
     def __init__(self, config: MAXLOneDOFConfig):
 
@@ -33,7 +27,7 @@ class MAXLOneDOF:
         num_ctrl_pts_in_history = int(np.ceil(self.history_length_us / self.interpolation_interval_us))
 
         # our pts are simpler, just time, pos... 
-        self._control_points: Deque[MAXLOneDOFControlPoint] = deque(maxlen = num_ctrl_pts_in_time_gap + num_ctrl_pts_in_history)
+        self._control_points = MAXLControlPointHistory(num_ctrl_pts_in_time_gap + num_ctrl_pts_in_history, self.interpolation_interval_us, 1, 0)
 
         self.max_accel = config.max_accel 
         self.max_vel = config.max_vel 
@@ -76,8 +70,8 @@ class MAXLOneDOF:
             # integrate positions, 
             self._position += self._velocity * (self.interpolation_interval_us / 1000000)                             
 
-        # stash it all, deque auto deletes from the tail, 
-        self._control_points.append(MAXLOneDOFControlPoint(time, self._position))
+        # stash it all, the ring drops the oldest when full, 
+        self._control_points.append([self._position], [], time)
 
         return offset + self._position 
     
@@ -139,28 +133,9 @@ class MAXLOneDOF:
 
     
     def get_states_at_time(self, time_us: int):
-        # index of the *most recently passed* control point, 
-        index = next((i for i, pt in enumerate(self._control_points) if (pt.time_us < time_us and time_us < (pt.time_us + self.interpolation_interval_us))), None)
-        if index is None:
-            oldest_pt_time = self._control_points[0].time
-            newest_pt_time = self._control_points[-1].time
-            raise Exception(F"MAXL couldn't find any control points around {time_us}, history spans {oldest_pt_time} ... {newest_pt_time}")
-        
-        if index < 0 or (index + 2) > len(self._control_points):
-            oldest_pt_time = self._control_points[0].time
-            newest_pt_time = self._control_points[-1].time
-            raise Exception(F"MAXL doesn't have enough local history around {time_us} to resolve states, history spans {oldest_pt_time} ... {newest_pt_time}, {index} of {len(self._control_points)}")
-
-        local_pts = [
-            self._control_points[index - 1].position,
-            self._control_points[index].position,
-            self._control_points[index + 1].position,
-            self._control_points[index + 2].position
-        ]
-
-        t1 = self._control_points[index].time_us
-
-        return get_states_from_spline_pts(*local_pts, t1, time_us, self.interpolation_interval_us)
+        # history is 1-dof, so we unwrap to [pos, vel, acc, jerk] scalars 
+        states, _ = self._control_points.get_states_at_us(time_us)
+        return [state[0] for state in states]
 
     # rate is direction-and-rate, backoff = abs(backoff) 
     async def home(self, switch: Callable[[], Awaitable[Tuple[int, bool]]], rate: float, backoff: float):
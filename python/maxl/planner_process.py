@@ -0,0 +1,403 @@
+import asyncio
+import multiprocessing
+import queue
+import time
+import traceback
+from typing import Any, Callable, Dict
+
+import numpy as np
+import numpy.typing as npt
+
+from .queue_planner import MAXLQueuePlanner, MAXLQueueConfig, HWMProfiler
+from .shared_ring import MAXLSharedControlPointRing
+
+# ring header slots we use, (after the ring's own head / tail)
+PLANNER_STOP = 2                # parent -> planner
+PLANNER_DO_RECALCULATIONS = 3   # parent -> planner
+PLANNER_RUNNING = 4             # planner -> parent, from here on
+PLANNER_ERROR = 5
+PLANNER_QUEUE_LENGTH = 6
+PLANNER_COMMANDS_DONE = 7
+PLANNER_REPLAN_BUDGET_US = 8    # parent -> planner, -1 for none
+PLANNER_DRAINED_AT = 9          # the (ring) time of the first pt w/ an empty queue, -1 while it has moves
+# and scratch slots,
+PLANNER_PROFILERS = 0           # (avg, hwm) for add-segment, new-control-points and replan
+PLANNER_POSITION_TAIL = 6       # then len(axes) of the queue's tail position
+PLANNER_FEED_OVERRIDE = 29      # parent -> planner
+PLANNER_ELIMINATED = 30         # (short, colinear) moves the front end has eliminated
+
+# the planner process keeps this many pts rendered ahead of what MAXLCore has taken,
+# which adds (lookahead * interval) of latency between a goto and its first motion
+PLANNER_LOOKAHEAD_PTS = 8
+PLANNER_IDLE_SLEEP_S = 0.0005
+
+
+def _planner_main(handle, config: MAXLQueueConfig, axes_to_actuators: Callable[[npt.NDArray], npt.NDArray], commands, replies, lookahead_pts: int):
+    ring = MAXLSharedControlPointRing(*handle)
+    planner = MAXLQueuePlanner(config)
+    interval = planner.interpolation_interval
+    # our own time base, (MAXLCore takes pts in order, so it doesn't need to match its clock) 
+    # (and we start a full interval in, since the planner treats t_start_us == 0 as unset)
+    next_time = interval
+    commands_done = 0
+    try:
+        ring.header[PLANNER_RUNNING] = 1
+        while not ring.header[PLANNER_STOP]:
+            busy = False
+
+            # new moves and halts, in order,
+            while True:
+                try:
+                    command = commands.get_nowait()
+                except queue.Empty:
+                    break
+                if command[0] == "goto":
+                    planner._add_segment(command[1], command[2])
+                elif command[0] == "goto_many":
+                    planner._add_segments(command[1], command[2])
+                elif command[0] == "goto_offline":
+                    planner._add_path(command[1], command[2])
+                elif command[0] == "goto_arc":
+                    planner._add_arc(command[1], command[2], command[3], command[4])
+                elif command[0] == "halt":
+                    planner._clear_queue()
+                elif command[0] == "profile":
+                    replies.put(planner._get_profile_report())
+                    if command[1]:
+                        planner._reset_profilers()
+                commands_done += 1
+                busy = True
+
+            planner.do_recalculations = bool(ring.header[PLANNER_DO_RECALCULATIONS])
+            budget = int(ring.header[PLANNER_REPLAN_BUDGET_US])
+            planner.replan_budget_us = None if budget < 0 else budget
+            planner.feed_override = float(ring.scratch[PLANNER_FEED_OVERRIDE])
+
+            # keep the ring topped up,
+            count = min(lookahead_pts - len(ring), ring.free())
+            if count > 0:
+                times = next_time + interval * np.arange(count)
+                axes_pts = planner.on_new_control_points(times)
+                ring.write(times, axes_pts, axes_to_actuators(axes_pts))
+                next_time += interval * count
+                busy = True
+
+            # publish what the parent needs to see, after the pts that caused it,
+            # (and the count of commands done last, since the parent reads the rest once that moves)
+            ring.scratch[PLANNER_POSITION_TAIL:PLANNER_POSITION_TAIL + len(planner.axes)] = planner._get_position_tail()
+            ring.header[PLANNER_QUEUE_LENGTH] = len(planner.queue)
+            if len(planner.queue) > 0:
+                ring.header[PLANNER_DRAINED_AT] = -1
+            else:
+                # (or, if it's never had anything queued, from the start)
+                ring.header[PLANNER_DRAINED_AT] = planner._drain_time_us if planner._drain_time_us is not None else 0
+            ring.header[PLANNER_COMMANDS_DONE] = commands_done
+            for p, profiler in enumerate([planner._profiler_addsegment, planner._profiler_newcp, planner._profiler_replan]):
+                ring.scratch[PLANNER_PROFILERS + p * 2] = profiler.avg
+                ring.scratch[PLANNER_PROFILERS + p * 2 + 1] = profiler.hwm
+            ring.scratch[PLANNER_ELIMINATED] = planner._eliminated_short
+            ring.scratch[PLANNER_ELIMINATED + 1] = planner._eliminated_colinear
+
+            if not busy:
+                time.sleep(PLANNER_IDLE_SLEEP_S)
+
+    except Exception as err:
+        print(f"MAXL planner process: {err}")
+        print(traceback.format_exc())
+        ring.header[PLANNER_ERROR] = 1
+    finally:
+        ring.header[PLANNER_RUNNING] = 0
+        ring.close()
+
+
+# stands in for a MAXLQueuePlanner (for MAXLCore and for machines), with the real one
+# (and the axes -> actuators graph) running in their own process, so that they don't
+# share a GIL or an event loop with whatever else is going on here... positions come
+# back through a shared-memory ring, and graph / graph_many hand them to MAXLCore
+# axes_to_actuators has to be picklable, i.e. a module-level function
+class MAXLPlannerProcess:
+    def __init__(self, config: MAXLQueueConfig, axes_to_actuators: Callable[[npt.NDArray], npt.NDArray], actuator_dof: int,
+                 lookahead_pts: int = PLANNER_LOOKAHEAD_PTS):
+        self.config = config
+        self.axes = config.axes
+        self.lookahead_queue_length = config.lookahead_queue_length
+        self.interpolation_interval = config.interpolation_interval.value[0]
+        self.twin_to_real_gap_us = config.twin_to_real_gap_ms * 1000
+        self.min_distance = config.min_distance
+        self.lookahead_pts = lookahead_pts
+        # the planner's signals don't cross the process boundary, so we poll its header, 
+        # once per control pt (the soonest anything there can change) 
+        self._poll_s = self.interpolation_interval / 1000000
+        # except for draining, which we can tell from the pts MAXLCore takes from the ring, (as the 
+        # planner does from the pts it renders) once they're past the one where the queue ran out 
+        self._drained = asyncio.Event()
+        self._drained.set()
+        self._drain_time_us = None
+        self._last_ring_time = -1
+
+        self._ring = MAXLSharedControlPointRing(lookahead_pts * 4, len(self.axes), actuator_dof)
+        self._ring.header[PLANNER_DO_RECALCULATIONS] = 1
+        self._ring.header[PLANNER_REPLAN_BUDGET_US] = -1
+        self._ring.scratch[PLANNER_FEED_OVERRIDE] = 1.0
+        # spawn, not fork: we don't want a copy of this process' usb links & event loop
+        context = multiprocessing.get_context("spawn")
+        self._commands = context.Queue()
+        # (for the few commands that answer back)
+        self._replies = context.Queue()
+        self._process = context.Process(
+            target = _planner_main,
+            args = (self._ring.handle(), config, axes_to_actuators, self._commands, self._replies, lookahead_pts),
+            daemon = True
+        )
+        self._commands_sent = 0
+
+        # like the planner, we keep our own offset and tail,
+        self._offset = np.zeros(len(self.axes))
+        self._position_tail = np.zeros(len(self.axes))
+        self._last_pos_out = np.zeros(len(self.axes))
+        self._last_actuator_out = np.zeros(actuator_dof)
+        self.starved_pts = 0
+        self._views_held = 0
+
+    def start(self, timeout_s: float = 10):
+        self._process.start()
+        start = time.perf_counter()
+        while not self._ring.header[PLANNER_RUNNING]:
+            if self._ring.header[PLANNER_ERROR] or not self._process.is_alive() or time.perf_counter() - start > timeout_s:
+                self.stop()
+                raise Exception("MAXL planner process failed to start")
+            time.sleep(0.01)
+
+    def stop(self):
+        self._ring.header[PLANNER_STOP] = 1
+        self._process.join(timeout = 5)
+        if self._process.is_alive():
+            self._process.terminate()
+        self._ring.close()
+
+    # ----------------------------------------------------- MAXLCore's side
+
+    @property
+    def do_recalculations(self) -> bool:
+        return bool(self._ring.header[PLANNER_DO_RECALCULATIONS])
+
+    @do_recalculations.setter
+    def do_recalculations(self, value: bool):
+        self._ring.header[PLANNER_DO_RECALCULATIONS] = int(value)
+
+    @property
+    def replan_budget_us(self) -> float | None:
+        budget = int(self._ring.header[PLANNER_REPLAN_BUDGET_US])
+        return None if budget < 0 else budget
+
+    @replan_budget_us.setter
+    def replan_budget_us(self, value: float | None):
+        self._ring.header[PLANNER_REPLAN_BUDGET_US] = -1 if value is None else int(value)
+
+    # as on the planner, (which does the ramping)
+    @property
+    def feed_override(self) -> float:
+        return float(self._ring.scratch[PLANNER_FEED_OVERRIDE])
+
+    @feed_override.setter
+    def feed_override(self, value: float):
+        if value <= 0:
+            raise ValueError(f"feed override should be > 0, not {value}")
+        self._ring.scratch[PLANNER_FEED_OVERRIDE] = min(float(value), self.config.max_feed_override)
+
+    def graph(self, time: int):
+        axes_pts, actuator_pts = self.graph_many(np.array([time]))
+        return axes_pts[0], actuator_pts[0]
+
+    # pts for a run of consecutive times, (n, axes) and (n, actuators)
+    # MAXLCore only ever asks for the next n intervals, so we just take the next n pts
+    # from the ring, rather than mapping its clock onto the planner's...
+    # where they're contiguous in the ring we return views of it, which stay valid
+    # until our next call (by which time MAXLCore has copied them into its history)
+    def graph_many(self, times: npt.NDArray):
+        if self._ring.header[PLANNER_ERROR]:
+            raise Exception("MAXL planner process has errored out")
+        # hand back the last call's slots,
+        self._ring.consume(self._views_held)
+        self._views_held = 0
+
+        count = len(times)
+        ring_times, axes_pts, actuator_pts = self._ring.peek(count)
+        if len(axes_pts) == count:
+            self._views_held = count
+            self._last_ring_time = int(ring_times[-1])
+        else:
+            # wrapped around the end of the ring, or the planner is behind, so we copy
+            axes_pts, actuator_pts = self._take_copies(count)
+
+        self._last_pos_out = axes_pts[-1].copy()
+        self._last_actuator_out = actuator_pts[-1].copy()
+        self._signal_drained(int(times[-1]))
+        return axes_pts, actuator_pts
+
+    # ----------------------------------------------------- queue API, as on MAXLQueuePlanner
+
+    async def goto_via_queue(self, position: npt.ArrayLike, target_vel: float):
+        position = np.array(position) - self._offset
+        await self._wait_for_room()
+        await asyncio.sleep(0)
+        if np.linalg.norm(position - self._position_tail) >= self.min_distance:
+            self._position_tail = position.copy()
+        self._send("goto", position, target_vel)
+
+    # a polyline in chunks, as on the planner, but since we can't see its queue directly 
+    # we wait for each chunk to land before sizing the next 
+    async def goto_many(self, positions: npt.ArrayLike, target_vel: float):
+        positions = np.asarray(positions, dtype = np.float64).reshape(-1, len(self.axes)) - self._offset 
+        start = 0 
+        while start < len(positions):
+            await self._await_commands()
+            room = await self._wait_for_room()
+            self._send("goto_many", positions[start:start + room], target_vel)
+            start += room 
+        # the planner drops short moves, so we take its word for where the tail is 
+        await self._await_commands()
+        self._position_tail = self._ring.scratch[PLANNER_POSITION_TAIL:PLANNER_POSITION_TAIL + len(self.axes)].copy()
+
+    # a whole path, planned at once over in the planner process... which doesn't top up the ring while 
+    # it plans, so very long paths are best queued while stopped 
+    async def goto_offline(self, positions: npt.ArrayLike, target_vel: float):
+        positions = np.asarray(positions, dtype = np.float64).reshape(-1, len(self.axes)) - self._offset 
+        await self._await_commands()
+        await self._wait_for_room()
+        self._send("goto_offline", positions, target_vel)
+        await self._await_commands()
+        self._position_tail = self._ring.scratch[PLANNER_POSITION_TAIL:PLANNER_POSITION_TAIL + len(self.axes)].copy()
+
+    # an arc, as on the planner, (which works out where it ends, so we take its word for the tail) 
+    async def goto_arc(self, position: npt.ArrayLike, center: npt.ArrayLike, clockwise: bool, target_vel: float):
+        position = np.array(position, dtype = np.float64) - self._offset 
+        center = np.array(center, dtype = np.float64) - self._offset 
+        await self._await_commands()
+        await self._wait_for_room()
+        self._send("goto_arc", position, center, clockwise, target_vel)
+        await self._await_commands()
+        self._position_tail = self._ring.scratch[PLANNER_POSITION_TAIL:PLANNER_POSITION_TAIL + len(self.axes)].copy()
+
+    # returns once the planner's queue has room for more, (and we're allowed to (re)plan it) with how much, 
+    # counting the commands it hasn't got to yet as a segment each 
+    async def _wait_for_room(self) -> int:
+        while True:
+            room = self.lookahead_queue_length - int(self._ring.header[PLANNER_QUEUE_LENGTH]) - self._commands_pending()
+            if room <= 0 or not self.do_recalculations:
+                await asyncio.sleep(self._poll_s)
+            else:
+                return room
+
+    async def goto_and_await(self, position: npt.ArrayLike, target_vel: float):
+        await self.goto_via_queue(position, target_vel)
+        await self.flush_queue()
+
+    async def halt(self):
+        self._send("halt")
+        await self._await_commands()
+        self._position_tail = self._ring.scratch[PLANNER_POSITION_TAIL:PLANNER_POSITION_TAIL + len(self.axes)].copy()
+        await self.flush_queue()
+        return self._position_tail + self._offset
+
+    # returns once everything queued has been run out on the machine, (see _signal_drained)
+    async def flush_queue(self):
+        await self._await_commands()
+        await self._drained.wait()
+
+    def set_current_position(self, position_set: npt.ArrayLike):
+        position_set = np.array(position_set)
+        self._offset = position_set - self._get_position_tail()
+
+    def _get_position_tail(self):
+        return self._position_tail.copy()
+
+    def get_eliminated_segment_counts(self) -> Dict[str, int]:
+        scratch = self._ring.scratch
+        return {"short": int(scratch[PLANNER_ELIMINATED]), "colinear": int(scratch[PLANNER_ELIMINATED + 1])}
+
+    # the planner's profile report, (as on MAXLQueuePlanner) which we have to ask its process for
+    async def get_profile_report(self, reset: bool = False) -> Dict[str, Any]:
+        self._send("profile", reset)
+        while True:
+            try:
+                return self._replies.get_nowait()
+            except queue.Empty:
+                if self._ring.header[PLANNER_ERROR]:
+                    raise Exception("MAXL planner process has errored out")
+                await asyncio.sleep(0.001)
+
+    # the planner's own hot-path profilers, as of its last pass
+    @property
+    def _profiler_addsegment(self) -> HWMProfiler:
+        return self._get_profiler(0)
+
+    @property
+    def _profiler_newcp(self) -> HWMProfiler:
+        return self._get_profiler(1)
+
+    @property
+    def _profiler_replan(self) -> HWMProfiler:
+        return self._get_profiler(2)
+
+    # ----------------------------------------------------- internals
+
+    def _take_copies(self, count: int):
+        axes_pts = np.empty((count, len(self.axes)))
+        actuator_pts = np.empty((count, self._ring.actuator_dof))
+
+        filled = 0
+        while filled < count:
+            ring_times, cartesian, actuator = self._ring.peek(count - filled)
+            if len(cartesian) == 0:
+                break
+            self._last_ring_time = int(ring_times[-1])
+            axes_pts[filled:filled + len(cartesian)] = cartesian
+            actuator_pts[filled:filled + len(cartesian)] = actuator
+            filled += len(cartesian)
+            self._ring.consume(len(cartesian))
+
+        # the planner is behind: we can't wait on it (we'd stall transmit), so we hold
+        # position, and this is a discontinuity if we were moving... but it beats missing pts
+        if filled < count:
+            self.starved_pts += count - filled
+            axes_pts[filled:] = axes_pts[filled - 1] if filled > 0 else self._last_pos_out
+            actuator_pts[filled:] = actuator_pts[filled - 1] if filled > 0 else self._last_actuator_out
+            print(f"MAXL: WARNING: planner process starved MAXL of {count - filled} pts")
+
+        return axes_pts, actuator_pts
+
+    def _send(self, *command):
+        # anything but a query (re)fills the queue, or leaves pts to run out after a halt
+        if command[0] != "profile":
+            self._drained.clear()
+            self._drain_time_us = None
+        self._commands.put(command)
+        self._commands_sent += 1
+
+    # MAXLCore has just taken pts up to time (on its clock) from the ring: once it's taken the first
+    # the planner rendered w/ an empty queue, the machine is done twin_to_real_gap after that,
+    # (and we only trust the planner's header once it's caught up w/ everything we've sent)
+    def _signal_drained(self, time: int):
+        if self._drained.is_set() or self._commands_pending() > 0:
+            return
+        drained_at = int(self._ring.header[PLANNER_DRAINED_AT])
+        if drained_at < 0 or self._last_ring_time < drained_at:
+            return
+        if self._drain_time_us is None:
+            self._drain_time_us = time
+        if time - self.twin_to_real_gap_us >= self._drain_time_us:
+            self._drained.set()
+
+    def _commands_pending(self) -> int:
+        return self._commands_sent - int(self._ring.header[PLANNER_COMMANDS_DONE])
+
+    async def _await_commands(self):
+        while self._commands_pending() > 0:
+            if self._ring.header[PLANNER_ERROR]:
+                raise Exception("MAXL planner process has errored out")
+            await asyncio.sleep(0.001)
+
+    def _get_profiler(self, index: int) -> HWMProfiler:
+        scratch = self._ring.scratch
+        return HWMProfiler(hwm = float(scratch[PLANNER_PROFILERS + index * 2 + 1]), avg = float(scratch[PLANNER_PROFILERS + index * 2]))
@@ -1,33 +1,59 @@
 import asyncio 
+import math 
 import numpy as np 
 import numpy.typing as npt 
 from collections import deque 
-from typing import List, Deque
+from typing import Any, Dict, List, Deque, Tuple, Union
 from dataclasses import dataclass, field 
 
 from .types import MAXLInterpolationIntervals
-from .queue_planner_functional import MAXLQueueSegment, recalculate_queue, make_blocks 
+from .telemetry import MAXLHistogram
+from .queue_planner_functional import MAXLQueueSegment, MAXLPlannedPath, recalculate_queue, make_blocks, blend_corner, simplify_polyline, plan_path 
 
 import time 
 
+# torque-like segments cruise at no more than this much of their steady-state vel, 
+# (approaching it takes ~ tau * ln(1 / (1 - fraction)), so this is ~ 3 tau) 
+TORQUE_LIKE_CRUISE_FRACTION = 0.95 
+
+# native arcs spend at most this much of their accel limit on v^2 / r at vmax, which leaves 
+# sqrt(1 - fraction^2) of it (0.6) for speeding up and slowing down along the arc 
+ARC_CENTRIPETAL_FRACTION = 0.8 
+# and arc ends may sit this far off the circle thru the start, (as in grbl, both must be exceeded) 
+ARC_RADIUS_TOLERANCE = 0.005 
+ARC_RADIUS_TOLERANCE_RELATIVE = 0.001 
+
+# (for profiling: monotonic, and w/ sub-us resolution) 
 def get_microsecond_timestamp() -> float:
-    return time.time_ns() // 1e3 
+    return time.perf_counter_ns() / 1e3 
 
 @dataclass 
 class HWMProfiler:
     hwm: float = 0 
     avg: float = 0 
-    _start_time: int = 0 
+    _start_time: float = 0 
+    # every run, for percentiles 
+    histogram: MAXLHistogram = field(default_factory = MAXLHistogram, repr = False)
 
     def start(self):
         self._start_time = get_microsecond_timestamp() 
 
-    def stop(self):
+    def stop(self) -> float:
         run_time = get_microsecond_timestamp() - self._start_time
         if run_time > self.hwm:
             self.hwm = run_time 
         
         self.avg = self.avg * 0.99 + run_time * 0.01 
+        self.histogram.record(run_time)
+        return run_time 
+
+    def reset(self):
+        self.hwm = 0 
+        self.avg = 0 
+        self.histogram.reset() 
+
+    def summary(self) -> Dict[str, float | None]:
+        return {**self.histogram.summary(), "ewma": self.avg}
 
 
 @dataclass
@@ -44,6 +70,27 @@ class MAXLQueueConfig:
     junction_deviation: float 
     min_distance: float 
 
+    # per-axis jerk limits, w/ which segments ramp velocity w/ s-curves instead of trapezoids, 
+    # (accel is continuous, so max_accels can go much higher for the same ringing) 
+    max_jerks: npt.ArrayLike | None = None 
+
+    # per-axis speeds at which (a la torque_like_solver) motors run out of torque, w/ which 
+    # max_accels are the static (zero-speed) limits and accel falls off linearly w/ speed 
+    max_steadystate_vels: npt.ArrayLike | None = None 
+
+    # blend corners w/ arcs (deviating at most junction_deviation) in this many of the leading 
+    # axes, i.e. 2 for xy, moves on any other axes keep sharp (jd) corners... 0 doesn't blend 
+    blend_axes_count: int = 0 
+
+    # vertices within this distance of the line between their neighbours are merged away, so that 
+    # (near) colinear runs of moves become one segment... 0 doesn't merge 
+    merge_tolerance: float = 0 
+
+    # the most the (live) feed override can speed things up by: planned speeds are already at the limits, 
+    # so above 1 it runs past max_vels (and accels along the path by its square, past max_accels), which 
+    # need to be set w/ the headroom for it... by default the override only slows things down 
+    max_feed_override: float = 1.0 
+
 
 class MAXLQueuePlanner:
     # TBD if we need an osap 
@@ -53,26 +100,66 @@ class MAXLQueuePlanner:
         self.inertial_axes_count = config.inertial_axes_count 
         self.max_accels = np.array(config.max_accels)
         self.max_vels = np.array(config.max_vels)
+        self.max_jerks = None if config.max_jerks is None else np.array(config.max_jerks)
+        self.max_steadystate_vels = None if config.max_steadystate_vels is None else np.array(config.max_steadystate_vels)
         self.junction_deviation = config.junction_deviation 
         self.min_distance = config.min_distance 
+        self.blend_axes_count = config.blend_axes_count 
+        self.merge_tolerance = config.merge_tolerance 
+        self.max_feed_override = config.max_feed_override 
 
         self.interpolation_interval = config.interpolation_interval.value[0]
         self.twin_to_real_gap_us = config.twin_to_real_gap_ms * 1000 
         self.lookahead_queue_length = config.lookahead_queue_length 
 
+        # signals for whoever is waiting on the queue, set from on_new_control_point(s) 
+        # so that waiters wake on the control pt that frees them, not on a timer: 
+        # - space available: the queue is shorter than the lookahead, 
+        # - segment retired: one (or more) segments were run out and popped, 
+        # - drained: the queue is empty *and* the machine has caught up to the twin, 
+        #   which is twin_to_real_gap after the first pt we rendered w/o a queue 
+        self._space_available = asyncio.Event()
+        self._space_available.set() 
+        self._segment_retired = asyncio.Event()
+        self._drained = asyncio.Event()
+        self._drained.set() 
+        self._drain_time_us = None 
+        self._recalculations_allowed = asyncio.Event()
+
         # for blockage / unblockage during perf hotness times 
         self.do_recalculations = True 
+        # or, rather than blocking 'em, a time limit per replan (in us) which leaves what doesn't fit 
+        # for later, (see recalculate_queue) ... None is unlimited 
+        self.replan_budget_us: float | None = None 
+        self._replan_pending = False 
 
         # states 
         self.p_tail = np.zeros(len(self.axes))
-        self.queue: Deque[MAXLQueueSegment] = deque(maxlen = self.lookahead_queue_length + 64)
+        # (blending can add an arc per segment, so the queue may run to twice the lookahead) 
+        self._queue_maxlen = self.lookahead_queue_length * (2 if self.blend_axes_count > 0 else 1) + 64 
+        self.queue: Deque[Union[MAXLQueueSegment, MAXLPlannedPath]] = deque(maxlen = self._queue_maxlen)
         self._offset = np.zeros(len(self.axes))
         self._last_pos_out = None 
+        self._last_time_us = None 
+
+        # segments run on the planner's own timeline, which runs _feed_scale x as fast as system time, 
+        # (ramping to the feed override) and _traj_ref is the last (system, timeline) time we rendered 
+        self._feed_override = 1.0 
+        self._feed_scale = 1.0 
+        self._traj_ref: Tuple[int, float] | None = None 
 
         # profiling 
         self._profiler_addsegment = HWMProfiler() 
         self._profiler_newcp = HWMProfiler() 
         self._profiler_replan = HWMProfiler() 
+        # replans' passes, (see recalculate_queue) and block making, which happens as segments are 
+        # first rendered, so is also counted in _profiler_newcp 
+        self._profilers_phase = {name: HWMProfiler() for name in ["junction", "forward", "reverse", "blocks"]}
+        # and replan times by the length of the queue they ran over, in power-of-two bins 
+        self._replan_by_queue_length: Dict[int, MAXLHistogram] = {}
+        # and moves that the front end has eliminated, 
+        self._eliminated_short = 0 
+        self._eliminated_colinear = 0 
 
         # check for odditees 
         if self.inertial_axes_count > len(self.axes):
@@ -82,26 +169,41 @@ class MAXLQueuePlanner:
 
         if len(self.max_accels) != len(self.axes) or len(self.max_vels) != len(self.axes):
             raise ValueError(f"max_accels ({len(self.max_accels)}), max_vels ({len(self.max_vels)}), and axes ({len(self.axes)}) should all be of equal length")
+        if self.max_jerks is not None and len(self.max_jerks) != len(self.axes):
+            raise ValueError(f"max_jerks ({len(self.max_jerks)}) should be the same length as axes ({len(self.axes)})")
+        if self.max_steadystate_vels is not None:
+            if len(self.max_steadystate_vels) != len(self.axes):
+                raise ValueError(f"max_steadystate_vels ({len(self.max_steadystate_vels)}) should be the same length as axes ({len(self.axes)})")
+            if self.max_jerks is not None:
+                raise ValueError("torque-like (max_steadystate_vels) and jerk-limited (max_jerks) profiles can't be combined")
+        if self.blend_axes_count < 0 or self.blend_axes_count > self.inertial_axes_count:
+            raise ValueError(f"blend_axes_count ({self.blend_axes_count}) should be between 0 and inertial_axes_count ({self.inertial_axes_count})")
 
 
     # ----------------------------------------------------- flow ? 
 
     def on_new_control_point(self, time: int):
+        self._finish_replan() 
         self._profiler_newcp.start() 
+        self._last_time_us = time 
+        # (segments run on our own timeline, see feed_override) 
+        traj_time = self._to_traj_time(time)
         if len(self.queue) > 0:
             # firstly we need to assign a zero-time if our first element doesn't have one, 
             # this will be basically right-now, i.e. at the next control point, 
             if self.queue[0].t_start_us == 0:
-                self.queue[0].t_start_us = time
+                self.queue[0].t_start_us = traj_time
 
             # now we can try to remove oldies / cycle the queue, 
             for _ in range(len(self.queue)):
-                if self.queue[0].end_time() < time:
+                self._make_blocks(self.queue[0])
+                if self.queue[0].end_time() < traj_time:
                     # assign the next start if we have it, 
                     if len(self.queue) > 1:
                         self.queue[1].t_start_us = self.queue[0].end_time() 
                     # pop all historic segments, and track tail position, 
                     self.p_tail = (self.queue.popleft()).p_end 
+                    self._segment_retired.set() 
                 else:
                     # we are done clearing historical segments 
                     break 
@@ -109,7 +211,8 @@ class MAXLQueuePlanner:
         # we changed the length of the queue, do we still have items ?
         if len(self.queue) > 0:
             # now the 0th is the current, 
-            states = self.queue[0].states_at_time(time - self.queue[0].t_start_us)
+            states = self.queue[0].states_at_time(traj_time - self.queue[0].t_start_us)
+            self._signal_waiters(time)
             self._profiler_newcp.stop()
             self._last_pos_out = states.pos  
             return states.pos.copy()
@@ -117,42 +220,188 @@ class MAXLQueuePlanner:
         else:
             # we are totally queue-less, just ship the same point (we are stopped) 
             # return MAXLControlPoint(self.p_tail, time, point.flags)
+            self._signal_waiters(time, time)
             self._profiler_newcp.stop() 
             return self.p_tail.copy()
 
 
+    # batch-mode on_new_control_point, resolves positions for a run of (ascending) times in one go, 
+    # returns (len(times), len(axes)) 
+    def on_new_control_points(self, times: npt.ArrayLike) -> npt.NDArray:
+        self._finish_replan() 
+        self._profiler_newcp.start() 
+        times = np.asarray(times, dtype = np.int64)
+        positions = np.empty((len(times), len(self.axes)))
+        if len(times) == 0:
+            self._profiler_newcp.stop() 
+            return positions 
+        # (segments run on our own timeline, see feed_override) 
+        traj_times = self._to_traj_times(times)
+
+        if len(self.queue) > 0 and self.queue[0].t_start_us == 0:
+            self.queue[0].t_start_us = int(traj_times[0])
+
+        filled = 0 
+        idle_time = None 
+        while filled < len(times):
+            if len(self.queue) == 0:
+                # queue-less, we are stopped at the tail 
+                positions[filled:] = self.p_tail 
+                idle_time = int(times[filled])
+                break 
+
+            # times up-to-and-including the end of the current segment render from it, 
+            seg = self.queue[0]
+            self._make_blocks(seg)
+            seg_end = seg.end_time() 
+            count = int(np.searchsorted(traj_times[filled:], seg_end, side = 'right'))
+            if count > 0:
+                positions[filled:filled + count] = seg.positions_at_times(traj_times[filled:filled + count] - seg.t_start_us)
+                filled += count 
+
+            # and anything after that means this segment is history, 
+            if filled < len(times):
+                if len(self.queue) > 1:
+                    self.queue[1].t_start_us = seg_end 
+                self.p_tail = (self.queue.popleft()).p_end 
+                self._segment_retired.set() 
+
+        self._last_time_us = int(times[-1])
+        if len(self.queue) > 0:
+            self._last_pos_out = positions[-1].copy() 
+        self._signal_waiters(int(times[-1]), idle_time)
+        self._profiler_newcp.stop() 
+        return positions 
+
+
+    # time is the latest pt we've rendered, and idle_time the first of those that had no queue left to run, 
+    # (pts are rendered twin_to_real_gap ahead of the machine, so it reaches them at ~ time - gap) 
+    def _signal_waiters(self, time: int, idle_time: int | None = None):
+        if len(self.queue) < self.lookahead_queue_length:
+            self._space_available.set() 
+        if len(self.queue) == 0 and not self._drained.is_set():
+            if self._drain_time_us is None:
+                self._drain_time_us = idle_time if idle_time is not None else time 
+            if time - self.twin_to_real_gap_us >= self._drain_time_us:
+                self._drained.set() 
+
+
     # ----------------------------------------------------- queue API
 
     async def goto_via_queue(self, position: npt.ArrayLike, target_vel: float):
         position = np.array(position) - self._offset 
+        await self._wait_for_room() 
+        return self._add_segment(position, target_vel)
+    
+    # a whole polyline, (n, len(axes)), queued in chunks as the lookahead queue has room for them, 
+    # with one replan per chunk rather than per point 
+    async def goto_many(self, positions: npt.ArrayLike, target_vel: float):
+        positions = np.asarray(positions, dtype = np.float64).reshape(-1, len(self.axes)) - self._offset 
+        start = 0 
+        while start < len(positions):
+            await self._wait_for_room() 
+            room = self.lookahead_queue_length - len(self.queue)
+            self._add_segments(positions[start:start + room], target_vel)
+            start += room 
+
+    # a whole (known) path, (n, len(axes)), planned all at once rather than thru the lookahead window, 
+    # so that its speeds are globally time-optimal... it plays back after anything already queued, and 
+    # starts and ends stopped (planning runs here, on the loop, so for very long paths prefer a planner process) 
+    async def goto_offline(self, positions: npt.ArrayLike, target_vel: float):
+        positions = np.asarray(positions, dtype = np.float64).reshape(-1, len(self.axes)) - self._offset 
+        await self._wait_for_room() 
+        return self._add_path(positions, target_vel)
+
+    # an arc (a la G2 / G3) to position, around center, turning in the plane of the first two axes 
+    # (which must be inertial): other axes don't move, and position == start is a full circle... 
+    # it's one queue entry, at (up to) a constant speed, rather than a run of chords w/ a junction each 
+    async def goto_arc(self, position: npt.ArrayLike, center: npt.ArrayLike, clockwise: bool, target_vel: float):
+        position = np.array(position, dtype = np.float64) - self._offset 
+        center = np.array(center, dtype = np.float64) - self._offset 
+        await self._wait_for_room() 
+        return self._add_arc(position, center, clockwise, target_vel)
+
+    # returns once the queue has room for more and we're allowed to (re)plan it, 
+    async def _wait_for_room(self):
         while True:
-            if len(self.queue) >= self.lookahead_queue_length or self.do_recalculations != True:
-                await asyncio.sleep(0.1)
+            if len(self.queue) >= self.lookahead_queue_length:
+                self._space_available.clear() 
+                await self._space_available.wait() 
+            elif self.do_recalculations != True:
+                await self._recalculations_allowed.wait() 
             else:
                 # shim with breather for control point generation 
                 await asyncio.sleep(0)
-                return self._add_segment(position, target_vel)
-    
+                return 
+
     async def goto_and_await(self, position: npt.ArrayLike, target_vel: float):
         await self.goto_via_queue(position, target_vel)
         await self.flush_queue()
-        await asyncio.sleep(0.1) 
 
     async def halt(self):
-        # a little more complex, 
-        self.queue = deque(maxlen = self.lookahead_queue_length + 64)
-        self.p_tail = self._last_pos_out 
+        p_tail = self._clear_queue() 
         await self.flush_queue() 
-        return self.p_tail + self._offset
+        return p_tail + self._offset
 
+    # returns once everything queued has been run out on the machine, 
     async def flush_queue(self):
-        while True:
-            if len(self.queue) > 0:
-                await asyncio.sleep(0.01)
-            else:
-                await asyncio.sleep(self.twin_to_real_gap_us / 1000000)
-                return 
+        while len(self.queue) > 0:
+            self._segment_retired.clear() 
+            await self._segment_retired.wait() 
+        await self._drained.wait() 
+
+    @property 
+    def do_recalculations(self) -> bool:
+        return self._recalculations_allowed.is_set() 
+
+    @do_recalculations.setter 
+    def do_recalculations(self, value: bool):
+        if value:
+            self._recalculations_allowed.set() 
+        else:
+            self._recalculations_allowed.clear() 
     
+    # when the machine will have run out everything that's queued, (in the same system-us as 
+    # control pts, which are stamped w/ the time the machine reaches them) or None if it's idle, 
+    # a not-yet-started queue starts at the next pt, and this moves if the tail is replanned 
+    # (the queue's on our timeline, which we map back at the current feed scale) 
+    def get_queue_end_time_us(self) -> int | None:
+        if len(self.queue) == 0 or self._traj_ref is None:
+            return None 
+        t_ref, traj_ref = self._traj_ref 
+        t_start = self.queue[0].t_start_us 
+        if t_start == 0:
+            t_start = traj_ref + self.interpolation_interval * self._feed_scale 
+        # segments start at the (int) end of the last, so their durations sum exactly 
+        traj_end = t_start + sum(seg.duration_us() for seg in self.queue)
+        return t_ref + round((traj_end - traj_ref) / self._feed_scale)
+
+    # a live multiplier on speed: rather than replanning, we run the planned timeline this much faster 
+    # (or slower) as we render pts, ramping to it no faster than the current segment's accel allows, 
+    # (speeds scale by it, and accels along the path by its square) up to max_feed_override 
+    @property 
+    def feed_override(self) -> float:
+        return self._feed_override 
+
+    @feed_override.setter 
+    def feed_override(self, value: float):
+        if value <= 0:
+            raise ValueError(f"feed override should be > 0, not {value}")
+        self._feed_override = min(float(value), self.max_feed_override)
+
+    # the planner's hot paths and replan phases, w/ percentiles, in (real) us... 
+    # async, like the planner process' (which has to fetch it), and reset after reading if asked 
+    async def get_profile_report(self, reset: bool = False) -> Dict[str, Any]:
+        report = self._get_profile_report() 
+        if reset:
+            self._reset_profilers() 
+        return report 
+
+    # how many moves we've eliminated (since startup) before they became segments: short ones that were 
+    # coalesced into the next, and (near) colinear ones that were merged into their neighbours 
+    def get_eliminated_segment_counts(self) -> Dict[str, int]:
+        return {"short": self._eliminated_short, "colinear": self._eliminated_colinear}
+
     def set_current_position(self, position_set: npt.ArrayLike):
         position_set = np.array(position_set)
         current_position = self._get_position_tail()
@@ -171,46 +420,245 @@ class MAXLQueuePlanner:
         else:
             return self.p_tail.copy()
 
+    # system times to our timeline, which runs at _feed_scale, ramping that towards the feed override 
+    def _to_traj_times(self, times: npt.NDArray) -> npt.NDArray:
+        if self._traj_ref is None:
+            # (the timelines start together) 
+            self._traj_ref = (int(times[0]), float(times[0]))
+        t_ref, traj_ref = self._traj_ref 
+        if self._feed_scale == self._feed_override == 1:
+            traj_times = traj_ref + (times - t_ref)
+        else:
+            target, scale = self._feed_override, self._feed_scale 
+            if len(self.queue) == 0:
+                # we're stopped, so it can change outright 
+                scales = np.full(len(times), target)
+            else:
+                direction = float(np.sign(target - scale))
+                ramp = self._feed_ramp_rate(direction, traj_ref + (times[-1] - t_ref) * scale) * (times - t_ref)
+                scales = np.where(np.abs(target - scale) <= ramp, target, scale + np.sign(target - scale) * ramp)
+            # (integrating the scale, trapezoidally) 
+            steps = np.diff(times, prepend = t_ref) * (scales + np.concatenate([[scale], scales[:-1]])) / 2 
+            traj_times = traj_ref + np.cumsum(steps)
+            self._feed_scale = float(scales[-1])
+        self._traj_ref = (int(times[-1]), float(traj_times[-1]))
+        return np.round(traj_times).astype(np.int64)
+
+    def _to_traj_time(self, time: int) -> int:
+        if self._traj_ref is not None and self._feed_scale == self._feed_override == 1:
+            t_ref, traj_ref = self._traj_ref 
+            traj_time = traj_ref + (time - t_ref)
+            self._traj_ref = (time, traj_time)
+            return round(traj_time)
+        return int(self._to_traj_times(np.array([time], dtype = np.int64))[0])
+
+    # how fast (per us) the feed scale can change (in direction) over the pts out to traj_end, on our timeline: 
+    # changing it adds (d_scale/dt * v) of accel along the path, on top of the segment's own (a * scale^2), 
+    # and we keep the two together within its accel limit... checked at either end of the run, w/ v at its 
+    # top speed, so while a segment brakes at its limit the scale holds until it's done 
+    def _feed_ramp_rate(self, direction: float, traj_end: float) -> float:
+        rate = math.inf 
+        for traj_time in (self._traj_ref[1], traj_end):
+            found = self._segment_accel_at(traj_time)
+            if found is None:
+                continue 
+            seg, a = found 
+            # (blend arcs have no accel along them, so we fall back to the axes' limit) 
+            limit = seg.accel if seg.accel > 0 else float(np.min(self.max_accels[:max(self.blend_axes_count, 1)]))
+            rate = min(rate, max(limit - direction * a * self._feed_scale ** 2, 0) / max(seg.vmax, 1e-9))
+        return 0.0 if rate == math.inf else rate / 1000000 
+
+    # the segment running at traj_time (on our timeline) at the head of the queue, and its accel there 
+    def _segment_accel_at(self, traj_time: float) -> Tuple[MAXLQueueSegment, float] | None:
+        # (a segment that hasn't started yet starts at the next pt) 
+        t_start = self.queue[0].t_start_us if self.queue[0].t_start_us != 0 else self._traj_ref[1]
+        for k in range(min(len(self.queue), 2)):
+            seg = self.queue[k]
+            self._make_blocks(seg)
+            time_us = max(traj_time - t_start, 0)
+            if time_us <= seg.duration_us():
+                states = seg.states_at_time(int(time_us))
+                if isinstance(seg, MAXLPlannedPath):
+                    seg = seg.segment_at_time(time_us)
+                return seg, (0.0 if states is None else states.a)
+            t_start += seg.duration_us() 
+        return None 
+
+    def _get_profile_report(self) -> Dict[str, Any]:
+        return {
+            "add_segment_us": self._profiler_addsegment.summary(),
+            "new_control_point_us": self._profiler_newcp.summary(),
+            "replan_us": self._profiler_replan.summary(),
+            "phases_us": {name: profiler.summary() for name, profiler in self._profilers_phase.items()},
+            "replan_us_by_queue_length": {
+                f"{low}-{2 * low - 1}": histogram.summary() for low, histogram in sorted(self._replan_by_queue_length.items())
+            },
+            "queue_length": len(self.queue),
+        }
+
+    def _reset_profilers(self):
+        for profiler in [self._profiler_addsegment, self._profiler_newcp, self._profiler_replan, *self._profilers_phase.values()]:
+            profiler.reset() 
+        self._replan_by_queue_length = {} 
+
+    def _record_replan(self, run_time: float):
+        if len(self.queue) == 0:
+            return 
+        low = 1 << (len(self.queue).bit_length() - 1)
+        if low not in self._replan_by_queue_length:
+            self._replan_by_queue_length[low] = MAXLHistogram() 
+        self._replan_by_queue_length[low].record(run_time)
+
+    # blocks are made lazily, the first time a segment is rendered, so we make 'em here to time 'em 
+    # (planned paths make theirs up front) 
+    def _make_blocks(self, seg: Union[MAXLQueueSegment, MAXLPlannedPath]):
+        if isinstance(seg, MAXLQueueSegment) and len(seg.blocks) == 0:
+            self._profilers_phase["blocks"].start() 
+            make_blocks(seg)
+            self._profilers_phase["blocks"].stop() 
+
     def _add_segment(self, p_end: npt.ArrayLike, target_vel: float):
-        self._profiler_addsegment.start() 
         # assign a p_start to the segment, and walk the tail
         p_end = np.asarray(p_end)
         if p_end.size != len(self.axes):
             raise ValueError("p_end must be the same len as axes")
+        self._add_segments(p_end.reshape(1, -1), target_vel)
+
+    # appends a segment to each of p_ends (n, len(axes)) in order, w/ limits worked out for all of 'em 
+    # at once, and replans just the once at the end 
+    def _add_segments(self, p_ends: npt.NDArray, target_vel: float):
+        self._profiler_addsegment.start() 
+        # (blending into the queue's tail, if we have one) 
+        segments = self._make_segments(p_ends, target_vel, self.queue[-1] if len(self.queue) > 0 else None)
+        if len(segments) == 0:
+            self._profiler_addsegment.stop() 
+            return 
+        self._drained.clear() 
+        self._drain_time_us = None 
+        self.queue.extend(segments)
+        self._profiler_addsegment.stop() 
+
+        # print(f"MAXL: popped new queue item on, to {p_end} from {p_start}")
+        # print(f"MAXL: popped new queue item on, len {p_distance} at {vmax}")
+
+        # we'll just do this whenever we add a new chunk... 
+        # nevermind: we will do it only when we need to send a new chunk ... 
+        if self.do_recalculations:
+            self._replan() 
 
-        p_start = self._get_position_tail()
+    def _replan(self):
+        self._profiler_replan.start()
+        done = recalculate_queue(self.queue, self.junction_deviation, self.max_accels, profilers = self._profilers_phase, budget_us = self.replan_budget_us)
+        run_time = self._profiler_replan.stop()
+        self._record_replan(run_time)
+        self._replan_pending = not done 
 
-        p_delta = p_end - p_start
-        p_distance = np.linalg.norm(p_delta)
+    # a budgeted replan left some of the queue for later, which is now, if we're no longer pressed for time 
+    def _finish_replan(self):
+        if self._replan_pending and self.replan_budget_us is None and self.do_recalculations:
+            self._replan() 
 
-        if p_distance < self.min_distance:
-            print(f"MAXL: WARNING: rejecting move of {p_distance:.6f} for all axes vs min {self.min_distance}")
+    def _add_arc(self, p_end: npt.NDArray, center: npt.NDArray, clockwise: bool, target_vel: float):
+        self._profiler_addsegment.start() 
+        seg = self._make_arc(p_end, center, clockwise, target_vel)
+        if seg is None:
             self._profiler_addsegment.stop() 
             return 
-        
-        p_unit = p_delta / p_distance
+        self._drained.clear() 
+        self._drain_time_us = None 
+        self.queue.append(seg)
+        self._profiler_addsegment.stop() 
+        if self.do_recalculations:
+            self._replan() 
+
+    # plans a whole path at once, (see plan_path) and queues it as one entry, 
+    # (a one-off, which we keep out of the hot-path profilers) 
+    def _add_path(self, p_ends: npt.NDArray, target_vel: float):
+        segments = self._make_segments(p_ends, target_vel, None)
+        if len(segments) == 0:
+            return 
+        # the path starts stopped, so what's queued ahead of it is final once it's planned out to a stop, 
+        # which a budgeted replan may have left for later... we finish that here, and mark the tail planned 
+        # so that replans (which don't know paths) stop at it rather than running on into the path 
+        if len(self.queue) > 0 and isinstance(self.queue[-1], MAXLQueueSegment) and not self.queue[-1].planned:
+            recalculate_queue(self.queue, self.junction_deviation, self.max_accels) 
+            self.queue[-1].planned = True 
+        self._replan_pending = False 
+        self._drained.clear() 
+        self._drain_time_us = None 
+        self.queue.append(plan_path(segments, self.junction_deviation, self.max_accels))
+
+    # the guts of a halt, (here and in a planner process) drops the queue and returns the new tail, 
+    # which is wherever we've rendered up to 
+    def _clear_queue(self) -> npt.NDArray:
+        # a little more complex, 
+        self.queue = deque(maxlen = self._queue_maxlen)
+        self._replan_pending = False 
+        # (if we haven't rendered anything yet, we're still where we started) 
+        if self._last_pos_out is not None:
+            self.p_tail = self._last_pos_out.copy() 
+        # the machine still has to run out what we've already rendered, 
+        self._drained.clear() 
+        self._drain_time_us = None 
+        self._space_available.set() 
+        # and anyone waiting on the queue (now empty) to run out should move on to waiting for that 
+        self._segment_retired.set() 
+        return self.p_tail 
+
+    # the segments for moves to each of p_ends, from the queue's tail, w/ limits worked out for all of 'em 
+    # at once... blending into prev, if it's given 
+    def _make_segments(self, p_ends: npt.NDArray, target_vel: float, prev: MAXLQueueSegment | None) -> List[MAXLQueueSegment]:
+        # coalesce moves that are too short, and merge colinear ones, 
+        p_ends = np.asarray(p_ends, dtype = np.float64)
+        p_tail = self._get_position_tail() 
+        p_ends, short, colinear, dropped = simplify_polyline(p_tail, p_ends, self.min_distance, self.merge_tolerance)
+        self._eliminated_short += short 
+        self._eliminated_colinear += colinear 
+        # (once per call, dense polylines can have lots of these) 
+        if dropped == 1:
+            print(f"MAXL: WARNING: rejecting move shorter than min {self.min_distance}")
+        elif dropped > 1:
+            print(f"MAXL: WARNING: rejecting {dropped} moves shorter than min {self.min_distance}")
+        if len(p_ends) == 0:
+            return [] 
+        p_starts = np.concatenate([p_tail[np.newaxis], p_ends[:-1]])
+
+        p_deltas = p_ends - p_starts
+        p_distances = np.linalg.norm(p_deltas, axis = 1)
+        p_units = p_deltas / p_distances[:, np.newaxis]
 
         # pick max accel to fit bounds, 
-        acc_factor = np.abs(p_unit / np.asarray(self.max_accels))
-        max_acc_factor = np.max(acc_factor)
-        accels = p_unit * (1 / max_acc_factor)
-        accel = float(np.linalg.norm(accels))
+        acc_factor = np.abs(p_units / np.asarray(self.max_accels))
+        max_acc_factor = np.max(acc_factor, axis = 1)
+        accels = p_units * (1 / max_acc_factor)[:, np.newaxis]
+        accel = np.linalg.norm(accels, axis = 1)
 
         # and a max vel to fit bounds, 
-        vel_factor = np.abs(p_unit / np.asarray(self.max_vels))
-        max_vel_factor = np.max(vel_factor)
-        vels = p_unit * (1 / max_vel_factor)
-        vmax = min(target_vel, float(np.linalg.norm(vels)))
+        vel_factor = np.abs(p_units / np.asarray(self.max_vels))
+        max_vel_factor = np.max(vel_factor, axis = 1)
+        vels = p_units * (1 / max_vel_factor)[:, np.newaxis]
+        vmax = np.minimum(target_vel, np.linalg.norm(vels, axis = 1))
+
+        # and a max jerk, likewise, if we're doing s-curves 
+        if self.max_jerks is not None:
+            jerk_factor = np.abs(p_units / self.max_jerks)
+            max_jerk_factor = np.max(jerk_factor, axis = 1)
+            jerks = p_units * (1 / max_jerk_factor)[:, np.newaxis]
+            jerk = np.linalg.norm(jerks, axis = 1)
+
+        # or a steady-state vel, where we'd run out of torque... which we can only approach, 
+        # so we also cruise a little below it 
+        if self.max_steadystate_vels is not None:
+            ss_factor = np.abs(p_units / self.max_steadystate_vels)
+            max_ss_factor = np.max(ss_factor, axis = 1)
+            ss_vels = p_units * (1 / max_ss_factor)[:, np.newaxis]
+            v_steadystate = np.linalg.norm(ss_vels, axis = 1)
+            vmax = np.minimum(vmax, TORQUE_LIKE_CRUISE_FRACTION * v_steadystate)
 
         # calculate inertial distance and unit, 
         # ... which are used in jd maths 
-        inertial_delta = p_end[:self.inertial_axes_count] - p_start[:self.inertial_axes_count] 
-        inertial_distance = np.linalg.norm(inertial_delta) 
-        if self.inertial_axes_count != 0 and inertial_distance != 0:
-            inertial_unit = inertial_delta / inertial_distance 
-        else:
-            # uuuh... 
-            inertial_unit = np.array([])
+        inertial_deltas = p_deltas[:, :self.inertial_axes_count]
+        inertial_distances = np.linalg.norm(inertial_deltas, axis = 1)
 
         # print("--- add seg:")
         # print("       unit: ", p_unit, self.max_accels)
@@ -219,27 +667,102 @@ class MAXLQueuePlanner:
         # print(" vel_factor: ", vel_factor)
         # print("   vel pick: ", vels, vmax)
 
-        # we should stick it in a queue then
-        self.queue.append(MAXLQueueSegment(
+        # we should stick 'em in a queue then
+        segments = [] 
+        for i in range(len(p_ends)):
+            if self.inertial_axes_count != 0 and inertial_distances[i] != 0:
+                inertial_unit = inertial_deltas[i] / inertial_distances[i]
+            else:
+                # uuuh... 
+                inertial_unit = np.array([])
+            seg = MAXLQueueSegment(
+                p_ends[i], p_starts[i], 
+                self.inertial_axes_count, 
+                target_vel, 
+                p_units[i], 
+                float(p_distances[i]), 
+                float(accel[i]), 
+                float(vmax[i]),
+                inertial_unit, 
+                float(inertial_distances[i]), 
+                jerk = None if self.max_jerks is None else float(jerk[i]), 
+                v_steadystate = None if self.max_steadystate_vels is None else float(v_steadystate[i])
+            )
+            # cut the corner into this one w/ an arc, if we're blending 
+            if self.blend_axes_count > 0 and prev is not None:
+                blend = blend_corner(prev, seg, self.junction_deviation, self.max_accels, self.blend_axes_count)
+                if blend is not None:
+                    segments.append(blend)
+            segments.append(seg)
+            prev = seg 
+        return segments
+
+    # an arc segment from the queue's tail to p_end around center, (see goto_arc) 
+    # it meets its neighbours w/ jd, along its tangents at either end 
+    def _make_arc(self, p_end: npt.NDArray, center: npt.NDArray, clockwise: bool, target_vel: float) -> MAXLQueueSegment | None:
+        if self.inertial_axes_count < 2:
+            raise ValueError(f"MAXL: ERROR: arcs turn in the first two axes, which need to be inertial, have {self.inertial_axes_count}")
+        p_start = self._get_position_tail() 
+        if np.any(np.abs(p_end[2:] - p_start[2:]) > self.min_distance):
+            raise ValueError("MAXL: ERROR: arcs can't move axes out of their plane, (helical arcs aren't supported)")
+        radial_start = p_start[:2] - center[:2]
+        radial_end = p_end[:2] - center[:2]
+        radius = float(np.linalg.norm(radial_start))
+        delta_r = abs(float(np.linalg.norm(radial_end)) - radius)
+        if delta_r > ARC_RADIUS_TOLERANCE and delta_r > ARC_RADIUS_TOLERANCE_RELATIVE * radius:
+            raise ValueError(f"MAXL: ERROR: arc end is {delta_r} off the circle thru its start")
+        if radius < self.min_distance:
+            print(f"MAXL: WARNING: rejecting arc w/ radius shorter than min {self.min_distance}")
+            return None 
+
+        # angles are ccw, so cw arcs sweep the other way, (and a sweep of ~ nothing is a full circle) 
+        angle_start = math.atan2(radial_start[1], radial_start[0])
+        angle_end = math.atan2(radial_end[1], radial_end[0])
+        sweep = (angle_start - angle_end) if clockwise else (angle_end - angle_start)
+        sweep = sweep % (2 * math.pi)
+        if sweep * radius < self.min_distance:
+            sweep = 2 * math.pi 
+        arc_length = radius * sweep 
+
+        # unit is the tangent we leave along, and the end is wherever the circle puts it (which is 
+        # within tolerance of p_end) so that the next move starts where we actually finish 
+        dof = len(self.axes)
+        arc_radial = np.zeros(dof)
+        arc_radial[:2] = radial_start / radius 
+        unit = np.zeros(dof)
+        unit[:2] = [radial_start[1] / radius, - radial_start[0] / radius] if clockwise else [- radial_start[1] / radius, radial_start[0] / radius]
+        arc_center = p_start.copy() 
+        arc_center[:2] = center[:2]
+        exit_unit = - math.sin(sweep) * arc_radial + math.cos(sweep) * unit 
+        p_end = arc_center + radius * (math.cos(sweep) * arc_radial + math.sin(sweep) * unit)
+
+        # the tangent swings thru both axes, so we take the lesser of their limits, and hold v^2 / r 
+        # to a fraction of accel, leaving the rest for accel along the arc 
+        accel = float(np.min(np.asarray(self.max_accels)[:2]))
+        vmax = min(target_vel, float(np.min(np.asarray(self.max_vels)[:2])), math.sqrt(ARC_CENTRIPETAL_FRACTION * accel * radius))
+        jerk = None 
+        if self.max_jerks is not None:
+            jerk = float(np.min(self.max_jerks[:2]))
+        v_steadystate = None 
+        if self.max_steadystate_vels is not None:
+            v_steadystate = float(np.min(self.max_steadystate_vels[:2]))
+            vmax = min(vmax, TORQUE_LIKE_CRUISE_FRACTION * v_steadystate)
+
+        axes = self.inertial_axes_count 
+        return MAXLQueueSegment(
             p_end, p_start, 
-            self.inertial_axes_count, 
+            axes, 
             target_vel, 
-            p_unit, 
-            float(p_distance), 
-            accel, 
-            vmax,
-            inertial_unit, 
-            inertial_distance 
-        ))
-
-        self._profiler_addsegment.stop() 
-
-        # print(f"MAXL: popped new queue item on, to {p_end} from {p_start}")
-        # print(f"MAXL: popped new queue item on, len {p_distance} at {vmax}")
-
-        # we'll just do this whenever we add a new chunk... 
-        # nevermind: we will do it only when we need to send a new chunk ... 
-        if self.do_recalculations:
-            self._profiler_replan.start()
-            recalculate_queue(self.queue, self.junction_deviation, self.max_accels)
-            self._profiler_replan.stop() 
+            unit, 
+            arc_length, 
+            accel * math.sqrt(1 - ARC_CENTRIPETAL_FRACTION ** 2), 
+            vmax, 
+            unit[:axes].copy(), 
+            arc_length, 
+            jerk = jerk, 
+            v_steadystate = v_steadystate, 
+            arc_center = arc_center, 
+            arc_radial = arc_radial, 
+            arc_radius = radius, 
+            exit_inertial_unit = exit_unit[:axes].copy() 
+        ) 
@@ -1,7 +1,9 @@
+import math 
+import time 
 import numpy as np 
 import numpy.typing as npt 
-from dataclasses import dataclass, field 
-from typing import List 
+from dataclasses import dataclass, field, replace 
+from typing import Any, Dict, List 
 
 @dataclass 
 class MAXLTrajectoryStates:
@@ -18,6 +20,12 @@ class MAXLQueueBlock:
     vi: float 
     accel: float 
     t_total: float 
+    # (initial) accel ramps at this rate, only in jerk-limited segments 
+    jerk: float = 0 
+    # and in torque-like segments, velocity decays exponentially towards v_inf w/ time constant tau, 
+    # (in place of vi / accel / jerk), v(t) = v_inf + (vi - v_inf) e^(-t / tau) 
+    tau: float = 0 
+    v_inf: float = 0 
 
 
 @dataclass 
@@ -37,186 +45,627 @@ class MAXLQueueSegment:
     # unconstrained / planned, 
     vi: float = 0 
     vf: float = 0 
+    # the junction-deviation limit on vf, once we have a next segment to junction with, 
+    vj: float | None = None 
+    # and whether vf is final: nothing appended later can speed it up 
+    planned: bool = False 
     # it should be that if we have a start_time, 
     # we are moving or have been transmitted... 
     # / we are locked 
     blocks: List[MAXLQueueBlock] = field(default_factory = list)
     t_start_us: int = 0 
+    # with a jerk limit, velocity changes are s-curves rather than constant-accel ramps 
+    jerk: float | None = None 
+    # and with a steady-state velocity, accel falls off w/ speed (accel is then its static limit) 
+    v_steadystate: float | None = None 
+    # corner blends are arcs rather than lines: leaving p_start along unit, and turning around 
+    # arc_center, (arc_radial is the unit vector from the center out to p_start) 
+    arc_center: npt.NDArray | None = None 
+    arc_radial: npt.NDArray | None = None 
+    arc_radius: float = 0 
+    # the (inertial) direction we leave in, where it isn't inertial_unit, i.e. on arcs 
+    exit_inertial_unit: npt.NDArray | None = None 
 
-    def end_time(self):
-        if self.t_start_us == 0:
-            raise ValueError("MAXL: ERROR: shouldn't be calculating end_time with no t_start_us")
+    # the blocks' timeline, built once per set of blocks (they're only ever swapped out whole, 
+    # by make_blocks, or reset to [] by a replan) 
+    _timeline_blocks: List[MAXLQueueBlock] | None = field(default = None, init = False, repr = False, compare = False)
+    # block start / end times (cumulative, in floating point seconds), and stacked block params 
+    _t_starts: List[float] = field(default_factory = list, init = False, repr = False, compare = False)
+    _t_ends: List[float] = field(default_factory = list, init = False, repr = False, compare = False)
+    _t_starts_array: npt.NDArray | None = field(default = None, init = False, repr = False, compare = False)
+    _t_ends_array: npt.NDArray | None = field(default = None, init = False, repr = False, compare = False)
+    _vis: npt.NDArray | None = field(default = None, init = False, repr = False, compare = False)
+    _accels: npt.NDArray | None = field(default = None, init = False, repr = False, compare = False)
+    _jerks: npt.NDArray | None = field(default = None, init = False, repr = False, compare = False)
+    _taus: npt.NDArray | None = field(default = None, init = False, repr = False, compare = False)
+    _v_infs: npt.NDArray | None = field(default = None, init = False, repr = False, compare = False)
+    _p_starts: npt.NDArray | None = field(default = None, init = False, repr = False, compare = False)
+    # (on arcs) the distance along the arc at each block's start 
+    _s_starts: npt.NDArray | None = field(default = None, init = False, repr = False, compare = False)
+    _duration_us: int = field(default = 0, init = False, repr = False, compare = False)
+    # the block we last rendered from, since time only ever moves fwds thru a segment 
+    _block_cursor: int = field(default = 0, init = False, repr = False, compare = False)
 
+    def _timeline(self):
         if len(self.blocks) == 0:
             make_blocks(self)
+        if self._timeline_blocks is not self.blocks:
+            t_end = 0 
+            self._t_starts, self._t_ends = [], []
+            for block in self.blocks:
+                t_end += block.t_total 
+                self._t_starts.append(t_end - block.t_total)
+                self._t_ends.append(t_end)
+            self._t_starts_array = np.array(self._t_starts)
+            self._t_ends_array = np.array(self._t_ends)
+            self._vis = np.array([block.vi for block in self.blocks])
+            self._accels = np.array([block.accel for block in self.blocks])
+            self._jerks = np.array([block.jerk for block in self.blocks])
+            self._taus = np.array([block.tau for block in self.blocks])
+            self._v_infs = np.array([block.v_inf for block in self.blocks])
+            self._p_starts = np.array([block.p_start for block in self.blocks])
+            if self.arc_radius > 0:
+                # blocks are laid out along unit from p_start, which on arcs we read as distance along the arc 
+                self._s_starts = (self._p_starts - self.p_start) @ self.unit 
+            # blocks render time in floating point seconds, 
+            # here we are resolving integer microseconds - 
+            self._duration_us = int(t_end * 1000000)
+            self._block_cursor = 0 
+            self._timeline_blocks = self.blocks 
 
-        seg_time = 0 
-        for block in self.blocks:
-            seg_time += block.t_total 
+    def duration_us(self) -> int:
+        self._timeline()
+        return self._duration_us 
 
-        # blocks render time in floating point seconds, 
-        # here we are resolving integer microseconds - 
-        return self.t_start_us + int(seg_time * 1000000)
+    def end_time(self):
+        if self.t_start_us == 0:
+            raise ValueError("MAXL: ERROR: shouldn't be calculating end_time with no t_start_us")
+        return self.t_start_us + self.duration_us()
 
     # time_us in microseconds from the start of the block... 
     def states_at_time(self, time_us: int):
-        if len(self.blocks) == 0:
-            make_blocks(self)
+        self._timeline()
 
         # blocks render in floating point seconds 
         time = time_us / 1000000
+        t_ends = self._t_ends 
+        if time > t_ends[-1]:
+            return None 
 
-        for block in self.blocks:
-            if time > block.t_total:
-                time -= block.t_total
-                continue 
-            if time < block.t_total:
-                # print("interval, accel ", interval, block.accel)
-                dist_travelled = block.vi * time + (block.accel * np.power(time, 2) / 2)
-                pos = block.p_start + block.unit * dist_travelled
-                direction = block.unit
-                v = block.vi + block.accel * time
-                a = block.accel 
-
-                return MAXLTrajectoryStates(pos, direction, v, a)
-  
-        return None 
+        # pick up from the last block we rendered, (or start over if time went backwards) 
+        b = self._block_cursor 
+        if b > 0 and time <= t_ends[b - 1]:
+            b = 0 
+        while time > t_ends[b]:
+            b += 1 
+        self._block_cursor = b 
+
+        block = self.blocks[b]
+        time -= self._t_starts[b]
+        if block.tau > 0:
+            decay = math.exp(- time / block.tau)
+            dist_travelled = block.v_inf * time + (block.vi - block.v_inf) * block.tau * (1 - decay)
+            v = block.v_inf + (block.vi - block.v_inf) * decay 
+            a = - (block.vi - block.v_inf) * decay / block.tau 
+        else:
+            # print("interval, accel ", interval, block.accel)
+            dist_travelled = block.vi * time + (block.accel * time * time / 2) + (block.jerk * time * time * time / 6)
+            v = block.vi + block.accel * time + block.jerk * time * time / 2
+            a = block.accel + block.jerk * time 
+
+        if self.arc_radius > 0:
+            pos, direction = self._arc_states(self._s_starts[b] + dist_travelled)
+        else:
+            pos = block.p_start + block.unit * dist_travelled
+            direction = block.unit
+
+        return MAXLTrajectoryStates(pos, direction, v, a)
+
+    # position and direction at distance s along an arc, 
+    def _arc_states(self, s: float):
+        phi = s / self.arc_radius 
+        pos = self.arc_center + self.arc_radius * (math.cos(phi) * self.arc_radial + math.sin(phi) * self.unit)
+        direction = - math.sin(phi) * self.arc_radial + math.cos(phi) * self.unit 
+        return pos, direction 
+
+
+    # vectorized states_at_time, for an array of times (in microseconds from the start of the segment) 
+    # returns positions only, stacked as (len(times_us), dof) 
+    def positions_at_times(self, times_us: npt.NDArray) -> npt.NDArray:
+        self._timeline()
+        t_ends = self._t_ends_array 
+
+        # blocks render in floating point seconds, and we clip to the segment 
+        # (int-us rounding in end_time() can put us a hair past the last block) 
+        times = np.clip(np.asarray(times_us) / 1000000, 0, t_ends[-1])
+        b = np.minimum(np.searchsorted(t_ends, times, side = 'left'), len(t_ends) - 1)
+        dt = times - self._t_starts_array[b]
 
+        dist_travelled = self._vis[b] * dt + self._accels[b] * dt * dt / 2 + self._jerks[b] * dt * dt * dt / 6
+        taus = self._taus[b]
+        if taus.any():
+            # torque-like blocks are exponentials instead, 
+            decaying = taus > 0 
+            tau, v_inf, vi, t = taus[decaying], self._v_infs[b][decaying], self._vis[b][decaying], dt[decaying]
+            dist_travelled[decaying] = v_inf * t + (vi - v_inf) * tau * (1 - np.exp(- t / tau))
+        if self.arc_radius > 0:
+            phi = (self._s_starts[b] + dist_travelled)[:, np.newaxis] / self.arc_radius 
+            return self.arc_center + self.arc_radius * (np.cos(phi) * self.arc_radial + np.sin(phi) * self.unit)
+        return self._p_starts[b] + self.unit * dist_travelled[:, np.newaxis]
 
-def recalculate_queue(queue: List[MAXLQueueSegment], junction_deviation: float, max_accels: npt.NDArray):
+
+# the max. velocities through the corners between consecutive segments, 
+# (len(segments) - 1 of 'em) done for all pairs at once, over stacked units 
+def junction_velocities(segments: List[MAXLQueueSegment], junction_deviation: float, max_accels: npt.NDArray) -> npt.NDArray:
+    count = len(segments) - 1 
+    if count < 1:
+        return np.zeros(0)
+    axes = segments[0].inertial_axes_count 
+    max_accels = np.asarray(max_accels)
+
+    # gather into contiguous arrays, (segs w/o inertial motion have empty units, we zero those) 
+    inertial_distances = np.array([seg.inertial_distance for seg in segments])
+    vmaxes = np.array([seg.vmax for seg in segments])
+    units = np.zeros((len(segments), axes))
+    for i, seg in enumerate(segments):
+        if seg.inertial_unit.size == axes:
+            units[i] = seg.inertial_unit 
+    # arcs leave in a different direction than they arrive in, 
+    exit_units = units 
+    if any(seg.exit_inertial_unit is not None for seg in segments):
+        exit_units = units.copy() 
+        for i, seg in enumerate(segments):
+            if seg.exit_inertial_unit is not None:
+                exit_units[i] = seg.exit_inertial_unit 
+    curr_units, next_units = exit_units[:-1], units[1:]
+
+    # incoming and outgoing axes have real motion, do JD 
+    # angle betwixt, 
+    dot_prod = np.einsum('ij,ij->i', curr_units, next_units).clip(-1.0, 1.0)
+    rads_between = np.arccos(dot_prod)
+    # radius of arc, given jd:
+    # w/ note that 0-angle moves (straight lines) would produce infinite radii, so we clip 
+    jd_radius = junction_deviation / (1 - np.cos(np.maximum(0.001, rads_between) / 2))
+    # now, for angular acceleration, we have a = v^2/r where v is our linear speed, 
+    # so we could work out, given a max accel, what our v should be: v = sqrt(a*r)
+    # but we need a limiting accel... we have three accel limits but only one will 
+    # be limiting... 
+
+    # pick an accel, 
+    # use minimum when we have two-dof (producing scalars) or where 
+    # the 180' turnaround produces nan since vectors are parallel, 
+    jd_accel = np.full(count, np.min(max_accels), dtype = np.float64)
+    if axes == 3:
+        # so, the cross product of our two units is going to be perpendicular, it's the 
+        # axis that we are rotating around:
+        # (written out, np.cross costs more than the rest of this fn on short runs) 
+        (ax, ay, az), (bx, by, bz) = curr_units.T, next_units.T
+        perp_vect = np.stack([ay * bz - az * by, az * bx - ax * bz, ax * by - ay * bx], axis = 1)
+        perp_norm = np.sqrt(np.einsum('ij,ij->i', perp_vect, perp_vect))
+        turning = perp_norm != 0.0 
+        # otherwise we use the vector that is perpendicular to our corner to determine 
+        # which axes are dominating in acceleration thru this arc (we use its compliment)
+        perp_vect_unit = perp_vect / np.where(turning, perp_norm, 1.0)[:, np.newaxis]
+        complimentary_perp = 1 - np.abs(perp_vect_unit)
+        # where the biggest is the axis that this move is "mostly happening on", 0's are axes 
+        # we don't accel thru at all, etc, so we can pick and accel like (rm'ing all zeroes): 
+        candidates = np.divide(max_accels[:axes], complimentary_perp, out = np.full_like(complimentary_perp, np.inf), where = complimentary_perp != 0)
+        jd_accel = np.where(turning, candidates.min(axis = 1), jd_accel)
+
+    # now with an acceleration and radius of our "junction" we can select a maximum velocity 
+    # to make along this arc.
+    # todo would be to add a genuine arc in here... but perhaps better done with even more generic 
+    # spline fitting step... 
+    jd_velocity = np.sqrt(jd_accel * jd_radius)
+
+    # junction velocity also cannot be any greater than the surrounding vmaxes 
+    jd_velocity = np.minimum(jd_velocity, np.minimum(vmaxes[:-1], vmaxes[1:]))
+
+    # if both segments have motion on real axes, we can do jd, 
+    # otherwise we should do... minimum velocity action as linkage 
+    # TODO: maybe we can deploy some heuristic here so that we aren't crash stopping 
+    # every gd retract... 
+    # TODO: use a better heuristic than '2' haha 
+    pits = (inertial_distances[:-1] == 0) | (inertial_distances[1:] == 0)
+    pit_speeds = np.minimum(3, np.minimum(vmaxes[:-1], vmaxes[1:]))
+    return np.where(pits, pit_speeds, jd_velocity)
+
+
+# replans junction velocities, only over the tail of the queue that can still change: 
+# segments are only ever appended, which relaxes the final (stopped) constraint, so a 
+# junction that the reverse pass leaves at its forward-pass limit can't go any faster, 
+# and neither can anything before it... those are marked `planned`, and we start after 
+# the last of 'em (w/ full = True, we replan everything) 
+# profilers, if given, time each pass: anything w/ start() and stop(), (i.e. HWMProfilers) 
+# under "junction", "forward" and "reverse" (which includes the write-back) 
+# w/ budget_us, we replan for (about) that long at most, (see replan_within_budget) and 
+# return False if some of the queue was left for a later call 
+def recalculate_queue(queue: List[MAXLQueueSegment], junction_deviation: float, max_accels: npt.NDArray, full: bool = False, 
+                      profilers: Dict[str, Any] | None = None, budget_us: float | None = None) -> bool:
     # print("----- recalculating")
     # fwds, reverse pass, junctions...
+    if len(queue) == 0:
+        return True 
 
-    # --------------------------------------- 1: max junction velocities w/ jd 
-    # print("\n----- jd pass")
-    for i in range(len(queue) - 1):
-        curr_seg = queue[i]
-        next_seg = queue[i + 1]
-        # if both segments have motion on real axes, we can do jd (and will need to clip units)
-        # otherwise we should do... minimum velocity action as linkage 
-        if curr_seg.inertial_distance == 0 or next_seg.inertial_distance == 0:
-            # segments with zero inertial distance should have vi, vf == 0 ? 
-            # TODO: maybe we can deploy some heuristic here so that we aren't crash stopping 
-            # every gd retract... 
-            # TODO: use a better heuristic than '2' haha 
-            pit_speed = np.min([3, curr_seg.vmax, next_seg.vmax])
-            curr_seg.vf = pit_speed
-            next_seg.vi = pit_speed 
-        else: 
-            # incoming and outgoing axes have real motion, do JD 
-            # angle betwixt, 
-            dot_prod = np.clip(np.dot(curr_seg.inertial_unit, next_seg.inertial_unit), -1.0, 1.0)
-            rads_between = np.arccos(dot_prod)
-            # radius of arc, given jd:
-            # w/ note that 0-angle moves (straight lines) would produce infinite radii, so we clip 
-            jd_radius = junction_deviation / (1 - np.cos(max(0.001, rads_between) / 2))
-            # now, for angular acceleration, we have a = v^2/r where v is our linear speed, 
-            # so we could work out, given a max accel, what our v should be: v = sqrt(a*r)
-            # but we need a limiting accel... we have three accel limits but only one will 
-            # be limiting... 
-
-            # so, the cross product of our two units is going to be perpendicular, it's the 
-            # axis that we are rotating around:
-            perp_vect = np.cross(curr_seg.inertial_unit, next_seg.inertial_unit)
-            perp_norm = np.linalg.norm(perp_vect)
-
-            # pick an accel, 
-            jd_accel = 0 
-            # use minimum when we have two-dof (producing scalars) or where 
-            # the 180' turnaround produces nan since vectors are parallel, 
-            if perp_vect.size == 1:
-                jd_accel = np.min(max_accels)
-            elif perp_norm == 0.0:
-                jd_accel = np.min(max_accels)
-            else:
-                # otherwise we use the vector that is perpendicular to our corner to determine 
-                # which axes are dominating in acceleration thru this arc (we use its compliment)
-                perp_vect_unit = perp_vect * (1 / perp_norm)
-                complimentary_perp = np.ones(len(max_accels[:curr_seg.inertial_axes_count])) - np.abs(perp_vect_unit)
-                # where the biggest is the axis that this move is "mostly happening on", 0's are axes 
-                # we don't accel thru at all, etc, so we can pick and accel like:
-                # rm all zeroes, 
-                jd_accel = np.min((1 / complimentary_perp[complimentary_perp != 0]) * np.asarray(max_accels[:curr_seg.inertial_axes_count])[complimentary_perp != 0])
-
-            # now with an acceleration and radius of our "junction" we can select a maximum velocity 
-            # to make along this arc.
-            # todo would be to add a genuine arc in here... but perhaps better done with even more generic 
-            # spline fitting step... 
-            jd_velocity = np.sqrt(jd_accel * jd_radius)
-
-            # junction velocity also cannot be any greater than the surrounding vmaxes 
-            jd_velocity = np.min([jd_velocity, curr_seg.vmax, next_seg.vmax])
-
-            # this is our first set of vi / vf values, we stash 'em, 
-            curr_seg.vf = jd_velocity 
-            next_seg.vi = jd_velocity 
-
-            # print("---     seg:")
-            # print("       this: ", curr_seg.unit)
-            # print("       next: ", next_seg.unit, rads_between, jd_radius)
-            # print("       perp: ", perp_vect)
-            # print("       proj: ", complimentary_perp)
-            # print("  accs, rad: ", jd_accel, jd_radius)
-            # print("jd_velocity: ", jd_velocity)
-
-    # --------------------------------------- 2: forwards pass 
-    # print("\n----- fwds pass")
-    for i in range(len(queue) - 1):
-        curr_seg = queue[i]
-        next_seg = queue[i + 1]
+    if full:
+        for seg in queue:
+            seg.planned = False 
 
-        # to see what our *max* final velocity would be (if we were to do max accel during this period)
-        # we use use v_f^2 = v_i^2 + 2ad, 
-        vf_max = np.sqrt(np.power(curr_seg.vi, 2) + 2 * curr_seg.accel * curr_seg.distance)
-        
-        # if our current end-velocity is larger than this max, pinch it, 
-        if curr_seg.vf > vf_max:
-            curr_seg.vf = vf_max 
-            next_seg.vi = vf_max 
+    if budget_us is not None:
+        return replan_within_budget(queue, junction_deviation, max_accels, time.perf_counter_ns() + int(budget_us * 1000), profilers)
 
+    # the first segment we have to touch, (whose vi is already settled) 
+    start = len(queue) - 1 
+    while start > 0 and not queue[start - 1].planned:
+        start -= 1 
 
-        # print("---     seg:")
-        # print("  vi, accel: ", curr_seg.vi, curr_seg.accel)
-        # print("     vf_max: ", vf_max)
+    # --------------------------------------- 1: max junction velocities w/ jd, 
+    # (which only depend on the pair, so are computed once per junction, and in one go) 
+    # print("\n----- jd pass")
+    if profilers is not None:
+        profilers["junction"].start() 
+    first_new = start 
+    while first_new < len(queue) - 1 and queue[first_new].vj is not None:
+        first_new += 1 
+    if first_new < len(queue) - 1:
+        segments = [queue[i] for i in range(first_new, len(queue))]
+        for seg, vj in zip(segments, junction_velocities(segments, junction_deviation, max_accels)):
+            seg.vj = float(vj)
+    if profilers is not None:
+        profilers["junction"].stop() 
+        profilers["forward"].start() 
+
+    # the fwd / rev passes are sequential, so we run 'em over plain floats rather than 
+    # paying for np calls on scalars, one segment at a time 
+    suffix = [queue[i] for i in range(start, len(queue))]
+    # junction speeds, w/ v[0] as the suffix' (settled) entry speed and v[-1] its exit 
+    v = [suffix[0].vi] + [seg.vj for seg in suffix[:-1]] + [0.0]
+
+    # --------------------------------------- 2: forwards pass, from the jd limits 
+    # print("\n----- fwds pass")
+    for i in range(len(suffix) - 1):
+        # to see what our *max* final velocity would be (if we were to do max accel during this period)
+        # we use use v_f^2 = v_i^2 + 2ad (or the s-curve equivalent), and if our jd end-velocity is larger, we pinch it 
+        v[i + 1] = min(v[i + 1], max_exit_velocity(suffix[i], v[i]))
+    if profilers is not None:
+        profilers["forward"].stop() 
+        profilers["reverse"].start() 
 
     # --------------------------------------- 3: reverse pass 
     # print("\n----- rev pass")
-    for i in range(len(queue) - 1):
-        curr_seg = queue[len(queue) - i - 1]
-        prev_seg = queue[len(queue) - i - 2]
-
+    # the last segment always ends stopped, (v[-1] == 0) 
+    settled = 0 
+    for i in range(len(suffix) - 1, 0, -1):
         # to see what our *max* final velocity would be (if we were to max accel during this period)
-        # we use use v_f^2 = v_i^2 + 2ad, 
-        vi_max = np.sqrt(np.power(curr_seg.vf, 2) + 2 * curr_seg.accel * curr_seg.distance)
+        # we use use v_f^2 = v_i^2 + 2ad, (or the s-curve / torque-like equivalent) 
+        vi_max = max_entry_velocity(suffix[i], v[i + 1])
 
         # if we couldn't possibly deccel enough to meet this, pinch it 
-        if curr_seg.vi > vi_max:
-            curr_seg.vi = vi_max 
-            prev_seg.vf = vi_max 
-
-        # print("---     seg:")
-        # print("  vi, accel: ", curr_seg.vi, curr_seg.accel)
-        # print("     vi_max: ", vi_max)
-        # print("         vf: ", curr_seg.vf)
-
-    # --------------------------------------- 4: checkup pass 
-    # print("\n----- check pass")
-    for i in range(len(queue) - 1):
-        curr_seg = queue[i]
-        next_seg = queue[i + 1]
-        # print("---     seg:")
-        # print("         vi: ", curr_seg.vi)
-        # print("       vmax: ", curr_seg.vmax)
-        # print("         vf: ", curr_seg.vf)
-        if curr_seg.vf != next_seg.vi:
-            raise Exception("badness betwixt segments")
-
-    # --------------------------------------- 5: reset blocks (for recalc once they're needed)
-    for i in range(len(queue)):
-        queue[i].blocks = [] 
+        if v[i] > vi_max:
+            v[i] = vi_max 
+        elif settled == 0:
+            # otherwise this junction sits at its forward limit, and is settled, as is everything before it 
+            settled = i 
+
+    # --------------------------------------- 4: write back, and reset blocks where they've changed 
+    # (for recalc once they're needed)
+    for i, seg in enumerate(suffix):
+        if seg.vi != v[i] or seg.vf != v[i + 1]:
+            seg.vi = v[i]
+            seg.vf = v[i + 1]
+            seg.blocks = [] 
+        if i < settled:
+            seg.planned = True 
+    if profilers is not None:
+        profilers["reverse"].stop() 
+    return True 
+
+
+# the passes again, but against a deadline: the reverse pass runs first, over the junction limits alone 
+# and from the newest segment back, and once we're out of time it stops at the first junction it hasn't 
+# pinched below the current plan, then the fwd pass runs over what it reached, setting out from the 
+# current plan's speed there... so segments before the stop keep their speeds, the one across it only 
+# gets a faster exit (which it can reach, or the fwd pass would have pinched it) and the plan stays valid 
+# the newest segments (whose junctions are new, or which blending trimmed) are always replanned, and we 
+# walk the queue from its end, so that the work is only what we visit... returns True if we made it back 
+# to the first unplanned segment, otherwise nothing is marked planned, and the next replan picks up the rest 
+def replan_within_budget(queue: List[MAXLQueueSegment], junction_deviation: float, max_accels: npt.NDArray, deadline_ns: int, 
+                         profilers: Dict[str, Any] | None = None) -> bool:
+    if profilers is not None:
+        profilers["junction"].start() 
+    # junction limits are worked out in order, so the newest segments are those at the end w/o one 
+    newest = len(queue) - 1 
+    while newest > 0 and not queue[newest - 1].planned and queue[newest - 1].vj is None:
+        newest -= 1 
+    if newest < len(queue) - 1:
+        segments = [queue[i] for i in range(newest, len(queue))]
+        for seg, vj in zip(segments, junction_velocities(segments, junction_deviation, max_accels)):
+            seg.vj = float(vj)
+    if profilers is not None:
+        profilers["junction"].stop() 
+        profilers["reverse"].start() 
+
+    # v[i] is the speed at the junction into queue[i], and the last segment always ends stopped, 
+    v = [0.0] * (len(queue) + 1)
+    start = 0 
+    stop = 0 
+    settled = 0 
+    for i in range(len(queue) - 1, 0, -1):
+        prev = queue[i - 1]
+        if prev.planned:
+            # this junction is the (settled) entry to what we replan 
+            start = i 
+            break 
+        seg = queue[i]
+        vi_max = max_entry_velocity(seg, v[i + 1])
+        if prev.vj > vi_max:
+            v[i] = vi_max 
+        else:
+            v[i] = prev.vj 
+            if settled == 0:
+                # the rev pass left this junction at its limit, which nothing appended can raise, 
+                # so (if we finish) it's settled, and so is everything before it 
+                settled = i 
+        if i <= newest and v[i] >= seg.vi and time.perf_counter_ns() > deadline_ns:
+            stop = i 
+            break 
+    if profilers is not None:
+        profilers["reverse"].stop() 
+        profilers["forward"].start() 
+
+    # fwds from the stop, where the segment before it sets out at its current speed, (or from the entry) 
+    if stop > 0:
+        v[stop] = min(v[stop], max_exit_velocity(queue[stop - 1], queue[stop - 1].vi))
+    else:
+        v[start] = queue[start].vi 
+    for i in range(max(stop, start), len(queue)):
+        v[i + 1] = min(v[i + 1], max_exit_velocity(queue[i], v[i]))
+
+    # and write back, (from the segment across the stop) 
+    for i in range(stop - 1 if stop > 0 else start, len(queue)):
+        seg = queue[i]
+        vi = v[i] if i >= stop else seg.vi 
+        if seg.vi != vi or seg.vf != v[i + 1]:
+            seg.vi = vi 
+            seg.vf = v[i + 1]
+            seg.blocks = [] 
+        if stop == 0 and i < settled:
+            seg.planned = True 
+    if profilers is not None:
+        profilers["forward"].stop() 
+    return stop == 0 
+
+
+# the fastest we can leave a segment having entered at vi, 
+def max_exit_velocity(seg: MAXLQueueSegment, vi: float) -> float:
+    if seg.v_steadystate is not None:
+        return torque_like_max_exit_velocity(vi, seg.distance, seg.accel, seg.v_steadystate)
+    if seg.jerk is not None:
+        return s_curve_reachable_velocity(vi, seg.distance, seg.accel, seg.jerk)
+    return math.sqrt(vi * vi + 2 * seg.accel * seg.distance)
+
+
+# and the fastest we can enter it and still leave at vf, (which is the same, bar for torque-like 
+# segments, which brake harder than they accelerate) 
+def max_entry_velocity(seg: MAXLQueueSegment, vf: float) -> float:
+    if seg.v_steadystate is not None:
+        return torque_like_max_entry_velocity(vf, seg.distance, seg.accel, seg.v_steadystate)
+    return max_exit_velocity(seg, vf)
+
+
+# ----------------------------------------------------- jerk-limited (s-curve) ramps 
+# a velocity change w/ accel limited to a and jerk to j, starting and ending at zero accel: 
+# jerk up to a, hold it, jerk back down to zero (w/o the hold if a change is too small to reach a), 
+# which is half of a 7-phase s-curve... it's symmetric, so it covers (v0 + v1) / 2 * its duration 
+
+def s_curve_ramp_time(dv: float, accel: float, jerk: float) -> float:
+    dv = abs(dv)
+    if dv * jerk >= accel * accel:
+        return dv / accel + accel / jerk 
+    return 2 * math.sqrt(dv / jerk)
+
+
+def s_curve_ramp_distance(v0: float, v1: float, accel: float, jerk: float) -> float:
+    return (v0 + v1) / 2 * s_curve_ramp_time(v1 - v0, accel, jerk)
+
+
+# the fastest we can get to from v0 within distance, (the inverse of s_curve_ramp_distance) 
+def s_curve_reachable_velocity(v0: float, distance: float, accel: float, jerk: float) -> float:
+    # ramps that don't reach full accel have dv = s^2, w/ s^3 + 2 v0 s - d sqrt(j) = 0, 
+    # a depressed cubic w/ one real root, which we take in its (stable) hyperbolic form 
+    q = distance * math.sqrt(jerk)
+    if v0 == 0:
+        s = q ** (1 / 3)
+    else:
+        p = 2 * v0 
+        s = 2 * math.sqrt(p / 3) * math.sinh(math.asinh(1.5 * q / p * math.sqrt(3 / p)) / 3)
+    dv = s * s 
+    if dv * jerk > accel * accel:
+        # and those that do are a quadratic, dv^2 + dv (a^2 / j + 2 v0) + 2 v0 a^2 / j - 2 d a = 0 
+        b = accel * accel / jerk + 2 * v0 
+        c = 2 * v0 * accel * accel / jerk - 2 * distance * accel 
+        dv = - 2 * c / (b + math.sqrt(b * b - 4 * c))
+    return v0 + dv 
+
+
+# the (up to three) blocks of a ramp from v0 to v1, as [(vi, accel, jerk, t_total)] 
+def s_curve_ramp_phases(v0: float, v1: float, accel: float, jerk: float):
+    dv = abs(v1 - v0)
+    if dv == 0:
+        return []
+    sign = 1 if v1 > v0 else -1 
+    if dv * jerk >= accel * accel:
+        t_jerk = accel / jerk 
+        dv_jerk = accel * t_jerk / 2 
+        return [
+            (v0, 0, sign * jerk, t_jerk),
+            (v0 + sign * dv_jerk, sign * accel, 0, (dv - 2 * dv_jerk) / accel),
+            (v1 - sign * dv_jerk, sign * accel, - sign * jerk, t_jerk),
+        ]
+    a_peak = math.sqrt(dv * jerk)
+    t_jerk = a_peak / jerk 
+    return [
+        (v0, 0, sign * jerk, t_jerk),
+        (v0 + sign * dv / 2, sign * a_peak, - sign * jerk, t_jerk),
+    ]
+
+
+def make_s_curve_blocks(seg: MAXLQueueSegment) -> List[MAXLQueueBlock]:
+    accel, jerk = seg.accel, seg.jerk 
+
+    # both ramps grow w/ the peak, so we cruise at vmax if they fit, else find the peak that does 
+    def ramps_distance(v_peak):
+        return s_curve_ramp_distance(seg.vi, v_peak, accel, jerk) + s_curve_ramp_distance(v_peak, seg.vf, accel, jerk)
+
+    v_peak = seg.vmax 
+    if ramps_distance(v_peak) > seg.distance:
+        lo, hi = max(seg.vi, seg.vf), seg.vmax 
+        for _ in range(64):
+            mid = (lo + hi) / 2 
+            if ramps_distance(mid) <= seg.distance:
+                lo = mid 
+            else:
+                hi = mid 
+        v_peak = lo 
+    cruise_dist = seg.distance - ramps_distance(v_peak)
+
+    phases = s_curve_ramp_phases(seg.vi, v_peak, accel, jerk)
+    if cruise_dist > 0 and v_peak > 0:
+        phases.append((v_peak, 0, 0, cruise_dist / v_peak))
+    phases += s_curve_ramp_phases(v_peak, seg.vf, accel, jerk)
+
+    seg.blocks = []
+    dist = 0 
+    for vi, a, j, t in phases:
+        seg.blocks.append(MAXLQueueBlock(
+            p_start = seg.p_start + seg.unit * dist, 
+            unit = seg.unit, 
+            vi = vi, 
+            accel = a, 
+            t_total = t, 
+            jerk = j
+        ))
+        dist += vi * t + a * t * t / 2 + j * t * t * t / 6 
+    return seg.blocks 
+
+
+# ----------------------------------------------------- torque-like (velocity-dependent accel) ramps 
+# as in torque_like_solver, accel falls off linearly w/ speed: a = a0 (1 - v / v_ss) speeding up, 
+# and a = - a0 (1 + v / v_ss) braking, so dv/dt is linear in v and (w/ tau = v_ss / a0) both are 
+# exponentials, approaching v_ss when speeding up and - v_ss when braking... so for times and 
+# distances we can integrate dt = dv / a(v) and dx = v dv / a(v) in closed form 
+
+# (these take floats, or arrays of 'em, i.e. for torque_like_solver's solve_many... scalars go thru math.log, 
+# which is much quicker than np.log on 'em, since the planner's passes call these a segment at a time) 
+def torque_like_accel_time(v0: float | npt.NDArray, v1: float | npt.NDArray, a0: float, v_ss: float) -> float | npt.NDArray:
+    ratio = (v_ss - v0) / (v_ss - v1)
+    return v_ss / a0 * (math.log(ratio) if type(ratio) is float else np.log(ratio))
+
+
+def torque_like_accel_distance(v0: float | npt.NDArray, v1: float | npt.NDArray, a0: float, v_ss: float) -> float | npt.NDArray:
+    ratio = (v_ss - v0) / (v_ss - v1)
+    return v_ss / a0 * (v_ss * (math.log(ratio) if type(ratio) is float else np.log(ratio)) - (v1 - v0))
+
+
+def torque_like_brake_time(v0: float | npt.NDArray, v1: float | npt.NDArray, a0: float, v_ss: float) -> float | npt.NDArray:
+    ratio = (v_ss + v0) / (v_ss + v1)
+    return v_ss / a0 * (math.log(ratio) if type(ratio) is float else np.log(ratio))
+
+
+def torque_like_brake_distance(v0: float | npt.NDArray, v1: float | npt.NDArray, a0: float, v_ss: float) -> float | npt.NDArray:
+    ratio = (v_ss + v0) / (v_ss + v1)
+    return v_ss / a0 * ((v0 - v1) - v_ss * (math.log(ratio) if type(ratio) is float else np.log(ratio)))
+
+
+# inverting those distances for the end speed gives u e^u = x, i.e. u = W(x), the lambert-w fn 
+# (on its 0 branch for speeding up, and -1 for braking), which we find w/ halley's method 
+def lambert_w(x: float, branch: int = 0) -> float:
+    if x == 0:
+        return 0.0 if branch == 0 else - math.inf 
+    # near the branch point (x = -1/e) both branches are ~ -1 +/- sqrt(2 (1 + e x)) 
+    root = math.sqrt(max(0.0, 2 * (1 + math.e * x)))
+    if branch == 0:
+        w = -1 + root if x < -0.25 else math.log1p(x)
+    else:
+        w = -1 - root if x < -0.25 else math.log(-x) - math.log(-math.log(-x))
+    for _ in range(32):
+        ew = math.exp(w)
+        f = w * ew - x 
+        if w == -1 or f == 0:
+            break 
+        step = f / (ew * (w + 1) - (w + 2) * f / (2 * w + 2))
+        w -= step 
+        if abs(step) <= 1e-15 * (1 + abs(w)):
+            break 
+    return w 
+
+
+def torque_like_max_exit_velocity(v0: float, distance: float, a0: float, v_ss: float) -> float:
+    # w/ u = (v_ss - v) / v_ss, the accel distance is d / (tau v_ss) = u - u0 + ln(u0 / u), so 
+    # - u e^-u = - u0 e^(-u0 - d / (tau v_ss)) 
+    u0 = (v_ss - v0) / v_ss 
+    x = - u0 * math.exp(- u0 - distance * a0 / (v_ss * v_ss))
+    return v_ss * (1 + lambert_w(x, 0))
+
+
+def torque_like_max_entry_velocity(v1: float, distance: float, a0: float, v_ss: float) -> float:
+    # likewise w/ u = (v_ss + v) / v_ss when braking, but on the other branch (u > 1) 
+    u1 = (v_ss + v1) / v_ss 
+    x = - u1 * math.exp(- u1 - distance * a0 / (v_ss * v_ss))
+    return - v_ss * (1 + lambert_w(x, -1))
+
+
+def make_torque_like_blocks(seg: MAXLQueueSegment) -> List[MAXLQueueBlock]:
+    a0, v_ss = seg.accel, seg.v_steadystate 
+
+    # as w/ s-curves, cruise at vmax if the ramps fit, else find the peak that does 
+    def ramps_distance(v_peak):
+        return torque_like_accel_distance(seg.vi, v_peak, a0, v_ss) + torque_like_brake_distance(v_peak, seg.vf, a0, v_ss)
+
+    v_peak = seg.vmax 
+    if ramps_distance(v_peak) > seg.distance:
+        lo, hi = max(seg.vi, seg.vf), seg.vmax 
+        for _ in range(64):
+            mid = (lo + hi) / 2 
+            if ramps_distance(mid) <= seg.distance:
+                lo = mid 
+            else:
+                hi = mid 
+        v_peak = lo 
+    cruise_dist = seg.distance - ramps_distance(v_peak)
+
+    # as (vi, v_inf, t_total), w/ v_inf == vi for the cruise 
+    phases = []
+    if v_peak > seg.vi:
+        phases.append((seg.vi, v_ss, torque_like_accel_time(seg.vi, v_peak, a0, v_ss)))
+    if cruise_dist > 0 and v_peak > 0:
+        phases.append((v_peak, v_peak, cruise_dist / v_peak))
+    if v_peak > seg.vf:
+        phases.append((v_peak, - v_ss, torque_like_brake_time(v_peak, seg.vf, a0, v_ss)))
+
+    seg.blocks = []
+    dist = 0 
+    for vi, v_inf, t in phases:
+        tau = v_ss / a0 if v_inf != vi else 0 
+        seg.blocks.append(MAXLQueueBlock(
+            p_start = seg.p_start + seg.unit * dist, 
+            unit = seg.unit, 
+            vi = vi, 
+            accel = 0, 
+            t_total = t, 
+            tau = tau, 
+            v_inf = v_inf 
+        ))
+        dist += vi * t if tau == 0 else v_inf * t + (vi - v_inf) * tau * (1 - math.exp(- t / tau))
+    return seg.blocks 
 
 
 def make_blocks(seg: MAXLQueueSegment) -> List[MAXLQueueBlock]:
+    if seg.v_steadystate is not None:
+        return make_torque_like_blocks(seg)
+    if seg.jerk is not None:
+        return make_s_curve_blocks(seg)
+
     max_vi = np.sqrt(np.power(seg.vf, 2) + 2 * seg.accel * seg.distance)
     max_vf = np.sqrt(np.power(seg.vi, 2) + 2 * seg.accel * seg.distance)
 
@@ -348,4 +797,241 @@ def make_blocks(seg: MAXLQueueSegment) -> List[MAXLQueueBlock]:
                 vi = seg.vmax, 
                 accel = - seg.accel,
                 t_total = deccel_dist / ((seg.vmax + seg.vf) / 2) 
-            )]
\ No newline at end of file
+            )]
+
+
+# ----------------------------------------------------- corner blending 
+# rather than slowing to a (virtual) junction-deviation arc's speed and then turning on the spot, 
+# we can cut corners w/ real arcs: tangent to both segments and deviating from the corner by at 
+# most junction_deviation, which we run at constant speed w/ v^2 / r inside the accel limits 
+
+# trims from_start off the start of a (line) segment, and from_end off its end, 
+def trim_segment(seg: MAXLQueueSegment, from_start: float, from_end: float):
+    distance = seg.distance - from_start - from_end 
+    seg.inertial_distance = seg.inertial_distance * distance / seg.distance 
+    seg.p_start = seg.p_start + seg.unit * from_start 
+    seg.p_end = seg.p_end - seg.unit * from_end 
+    seg.distance = distance 
+    seg.blocks = [] 
+
+
+# blends the corner between prev (the queue's tail) and seg (about to be appended), trimming both 
+# and returning the arc to queue between 'em, or None where we leave the corner to jd, 
+# blend_axes_count is how many (leading, inertial) axes we blend in: moves on any others keep sharp corners 
+def blend_corner(prev: MAXLQueueSegment, seg: MAXLQueueSegment, junction_deviation: float, max_accels: npt.NDArray, blend_axes_count: int) -> MAXLQueueSegment | None:
+    # we can't re-shape a segment that's already running, (or one inside a planned path) 
+    if not isinstance(prev, MAXLQueueSegment) or prev.t_start_us != 0 or prev.arc_radius != 0:
+        return None 
+    u1, u2 = prev.unit, seg.unit 
+    if np.any(u1[blend_axes_count:] != 0) or np.any(u2[blend_axes_count:] != 0):
+        return None 
+    cos_turn = float(np.clip(np.dot(u1, u2), -1.0, 1.0))
+    turn = math.acos(cos_turn)
+    # (straight thru isn't a corner, and reversals would need ~ zero radius) 
+    if turn < 1e-6 or turn > math.pi - 1e-3:
+        return None 
+
+    # the arc that passes junction_deviation inside the corner has r = jd cos(turn / 2) / (1 - cos(turn / 2)), 
+    # and meets each segment r tan(turn / 2) from the corner, which we limit so that neighbouring blends 
+    # (each taking < half of a segment) can't overlap, using a tighter arc where it's clipped 
+    half = turn / 2 
+    tan_half = math.tan(half)
+    radius = junction_deviation * math.cos(half) / (2 * math.sin(half / 2) ** 2)
+    tangent_dist = min(radius * tan_half, 0.4 * prev.distance, 0.4 * seg.distance)
+    radius = tangent_dist / tan_half 
+    # prev's entry speed may already be settled, (if the one before it is planned) and replans never 
+    # revisit that, so we can only cut as much off its end as still leaves room to slow from vi to vf 
+    if max_entry_velocity(replace(prev, distance = prev.distance - tangent_dist), prev.vf) < prev.vi:
+        return None 
+
+    corner = prev.p_end 
+    p_start = corner - u1 * tangent_dist 
+    p_end = corner + u2 * tangent_dist 
+    # the center is off to the inside of the turn, 
+    inward = u2 - u1 * cos_turn 
+    inward = inward / np.linalg.norm(inward)
+
+    # we turn in the plane of u1, u2, so pick the smallest accel of the axes in it, and go as fast as 
+    # v^2 / r allows, (or the segments do) 
+    moving = (u1[:blend_axes_count] != 0) | (u2[:blend_axes_count] != 0)
+    accel = float(np.min(np.asarray(max_accels)[:blend_axes_count][moving]))
+    vmax = min(math.sqrt(accel * radius), prev.vmax, seg.vmax)
+
+    trim_segment(prev, 0, tangent_dist)
+    trim_segment(seg, tangent_dist, 0)
+
+    # w/ no accel along the arc, the passes hold its entry and exit speeds equal, (so it's constant speed) 
+    arc_length = radius * turn 
+    axes = prev.inertial_axes_count 
+    return MAXLQueueSegment(
+        p_end, p_start, 
+        axes, 
+        seg.target_vel, 
+        u1, 
+        arc_length, 
+        0.0, 
+        vmax, 
+        u1[:axes].copy(), 
+        arc_length, 
+        arc_center = p_start + inward * radius, 
+        arc_radial = - inward, 
+        arc_radius = radius, 
+        exit_inertial_unit = u2[:axes].copy() 
+    )
+
+
+# ----------------------------------------------------- front end: coalescing short moves, merging colinear runs 
+# dense polylines (i.e. contours w/ a vertex per pixel) are mostly tiny, near-colinear moves, which are 
+# cheaper to plan and faster to run as fewer, longer segments 
+
+# vertices of pts (n, dof) that keep the polyline within tolerance, (douglas-peucker, w/ distances to 
+# the chord as a segment rather than a line, so that reversals keep their tips) the ends always stay 
+def douglas_peucker(pts: npt.NDArray, tolerance: float) -> npt.NDArray:
+    keep = np.zeros(len(pts), dtype = bool)
+    keep[0] = keep[-1] = True 
+    spans = [(0, len(pts) - 1)]
+    while len(spans) > 0:
+        a, b = spans.pop() 
+        if b - a < 2:
+            continue 
+        chord = pts[b] - pts[a]
+        rel = pts[a + 1:b] - pts[a]
+        chord_sq = chord @ chord 
+        t = np.clip(rel @ chord / chord_sq, 0, 1) if chord_sq > 0 else np.zeros(len(rel))
+        off = rel - t[:, np.newaxis] * chord 
+        dists = np.einsum('ij,ij->i', off, off)
+        i = int(np.argmax(dists))
+        if dists[i] > tolerance * tolerance:
+            keep[a + 1 + i] = True 
+            spans.append((a, a + 1 + i))
+            spans.append((a + 1 + i, b))
+    return keep 
+
+
+# the moves to p_ends (n, dof) from p_start, w/ those shorter than min_distance coalesced into the next, 
+# (measuring from the last one we kept, so they add up rather than getting lost) and those within 
+# tolerance of a straight line merged, (w/ tolerance 0, we don't merge) 
+# returns the p_ends we kept, and counts of moves eliminated as (short, colinear, dropped), where dropped 
+# are short moves at the end that we couldn't coalesce, and which don't reach the final p_end 
+def simplify_polyline(p_start: npt.NDArray, p_ends: npt.NDArray, min_distance: float, tolerance: float = 0):
+    # sequential, since each move starts where the last kept one ended, so on plain floats 
+    last, before_last = p_start.tolist(), None 
+    keep = []
+    for i, p_end in enumerate(p_ends.tolist()):
+        if math.dist(p_end, last) < min_distance:
+            continue 
+        keep.append(i)
+        before_last, last = last, p_end 
+    short = len(p_ends) - len(keep)
+
+    # a short last move would lose the end of the path, so it replaces the last vertex we kept instead, 
+    dropped = 0 
+    if len(p_ends) > 0 and (len(keep) == 0 or keep[-1] != len(p_ends) - 1):
+        if len(keep) > 0 and math.dist(p_ends[-1].tolist(), before_last) >= min_distance:
+            keep[-1] = len(p_ends) - 1 
+        else:
+            dropped = 1 if len(keep) > 0 else len(p_ends)
+            short -= dropped 
+    if len(keep) < len(p_ends):
+        p_ends = p_ends[keep]
+
+    colinear = 0 
+    if tolerance > 0 and len(p_ends) > 1:
+        merged = douglas_peucker(np.concatenate([p_start[np.newaxis], p_ends]), tolerance)[1:]
+        colinear = len(p_ends) - int(np.sum(merged))
+        p_ends = p_ends[merged]
+    return p_ends, short, colinear, dropped 
+
+
+# ----------------------------------------------------- offline planning 
+# when a whole path is known up front, we needn't plan it thru the lookahead window: w/ constant-accel 
+# ramps, speeds squared grow linearly w/ distance, so the fwd pass (v_k+1^2 = min(cap_k+1, v_k^2 + 2ad)) 
+# is a running minimum: w/ S_k the cumulative 2ad, v_k^2 = S_k + min_j<=k (cap_j - S_j), and the rev pass 
+# likewise, so we can plan every segment at once 
+
+# a whole path, planned (and w/ its blocks made) up front, which sits in the queue as one entry and plays 
+# its segments back to back... it starts and ends stopped, and replans never touch it 
+@dataclass 
+class MAXLPlannedPath:
+    segments: List[MAXLQueueSegment]
+    p_start: npt.NDArray 
+    p_end: npt.NDArray 
+    t_start_us: int = 0 
+    vi: float = 0 
+    vf: float = 0 
+    planned: bool = True 
+    # each segment's start, in (int) microseconds from the path's 
+    _seg_starts_us: npt.NDArray | None = field(default = None, repr = False)
+    _duration_us: int = field(default = 0, repr = False)
+    _seg_cursor: int = field(default = 0, init = False, repr = False, compare = False)
+
+    def duration_us(self) -> int:
+        return self._duration_us 
+
+    def end_time(self):
+        if self.t_start_us == 0:
+            raise ValueError("MAXL: ERROR: shouldn't be calculating end_time with no t_start_us")
+        return self.t_start_us + self._duration_us 
+
+    # as for segments, time_us from the start of the path 
+    def states_at_time(self, time_us: int):
+        if time_us > self._duration_us:
+            return None 
+        starts = self._seg_starts_us 
+        # time only moves fwds, so we pick up from the last segment we rendered, 
+        k = self._seg_cursor 
+        if time_us < starts[k]:
+            k = 0 
+        while k < len(self.segments) - 1 and time_us > starts[k + 1]:
+            k += 1 
+        self._seg_cursor = k 
+        return self.segments[k].states_at_time(int(time_us - starts[k]))
+
+    # the segment running at time_us, (from the start of the path) 
+    def segment_at_time(self, time_us: float) -> MAXLQueueSegment:
+        k = int(np.searchsorted(self._seg_starts_us, time_us, side = 'right')) - 1 
+        return self.segments[min(max(k, 0), len(self.segments) - 1)]
+
+    def positions_at_times(self, times_us: npt.NDArray) -> npt.NDArray:
+        times_us = np.asarray(times_us)
+        ks = np.maximum(np.searchsorted(self._seg_starts_us, times_us, side = 'left') - 1, 0)
+        positions = np.empty((len(times_us), len(self.p_end)))
+        # (times ascend, so each segment's are a contiguous run) 
+        bounds = np.flatnonzero(np.diff(ks)) + 1 
+        for a, b in zip(np.concatenate([[0], bounds]), np.concatenate([bounds, [len(times_us)]])):
+            k = ks[a]
+            positions[a:b] = self.segments[k].positions_at_times(times_us[a:b] - self._seg_starts_us[k])
+        return positions 
+
+
+# globally time-optimal speeds for segments (in order, starting and ending stopped), and their blocks 
+def plan_path(segments: List[MAXLQueueSegment], junction_deviation: float, max_accels: npt.NDArray) -> MAXLPlannedPath:
+    if any(seg.jerk is not None or seg.v_steadystate is not None for seg in segments):
+        # s-curve and torque-like ramps aren't linear in v^2, so we use the regular (sequential) passes, 
+        # which over the whole path are just as optimal 
+        recalculate_queue(segments, junction_deviation, max_accels, full = True)
+    else:
+        caps = np.zeros(len(segments) + 1)
+        caps[1:-1] = junction_velocities(segments, junction_deviation, max_accels)
+        caps = caps * caps 
+        gains = np.array([2 * seg.accel * seg.distance for seg in segments])
+        reach = np.concatenate([[0.0], np.cumsum(gains)])
+        fwds = reach + np.minimum.accumulate(caps - reach)
+        revs = np.minimum.accumulate((fwds + reach)[::-1])[::-1] - reach 
+        # (the cumulative sums cost us some round-off, which mustn't take us past the caps) 
+        v = np.sqrt(np.clip(revs, 0, caps)).tolist() 
+        for i, seg in enumerate(segments):
+            seg.vi, seg.vf = v[i], v[i + 1]
+            seg.blocks = [] 
+            seg.planned = True 
+
+    # and make every segment's blocks now, so that playback is only evaluation, 
+    durations = [seg.duration_us() for seg in segments]
+    seg_starts_us = np.concatenate([[0], np.cumsum(durations)]).astype(np.int64)
+    return MAXLPlannedPath(
+        segments, 
+        segments[0].p_start.copy(), 
+        segments[-1].p_end.copy(), 
+        _seg_starts_us = seg_starts_us, 
+        _duration_us = int(seg_starts_us[-1])
+    )
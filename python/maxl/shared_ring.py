@@ -0,0 +1,106 @@
+from multiprocessing import shared_memory
+
+import numpy as np
+import numpy.typing as npt
+
+# header slots (int64)
+RING_HEAD = 0               # pts ever written, only the producer moves this
+RING_TAIL = 1               # pts ever consumed, only the consumer moves this
+RING_HEADER_INTS = 16
+# and (float64) scratch, after the ints, for whatever the two sides want to publish
+RING_HEADER_FLOATS = 32
+
+# a single-producer, single-consumer ring of control points in shared memory,
+# i.e. between a planner process (writing) and MAXLCore (reading):
+# there are no locks, each side only ever moves its own counter, and the
+# producer writes a pt's data before bumping the head that makes it visible,
+# (which relies on stores not being reordered across numpy calls, true on x86
+# and in practice on arm / CPython, since each call is a full function boundary)
+class MAXLSharedControlPointRing:
+    def __init__(self, capacity: int, cartesian_dof: int, actuator_dof: int, name: str | None = None):
+        self.capacity = capacity
+        self.cartesian_dof = cartesian_dof
+        self.actuator_dof = actuator_dof
+
+        header_bytes = RING_HEADER_INTS * 8 + RING_HEADER_FLOATS * 8
+        size = header_bytes + capacity * 8 * (1 + cartesian_dof + actuator_dof)
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create = True, size = size)
+            self._owner = True
+        else:
+            self.shm = shared_memory.SharedMemory(name = name)
+            self._owner = False
+
+        # everything is a view into the one buffer, nothing is copied
+        buf = self.shm.buf
+        offset = 0
+        self.header = np.ndarray((RING_HEADER_INTS,), dtype = np.int64, buffer = buf, offset = offset)
+        offset += RING_HEADER_INTS * 8
+        self.scratch = np.ndarray((RING_HEADER_FLOATS,), dtype = np.float64, buffer = buf, offset = offset)
+        offset += RING_HEADER_FLOATS * 8
+        self.times = np.ndarray((capacity,), dtype = np.int64, buffer = buf, offset = offset)
+        offset += capacity * 8
+        self.positions_cartesian = np.ndarray((capacity, cartesian_dof), dtype = np.float64, buffer = buf, offset = offset)
+        offset += capacity * cartesian_dof * 8
+        self.positions_actuator = np.ndarray((capacity, actuator_dof), dtype = np.float64, buffer = buf, offset = offset)
+
+        if self._owner:
+            self.header[:] = 0
+            self.scratch[:] = 0
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    # to re-open the same ring in another process,
+    def handle(self):
+        return (self.capacity, self.cartesian_dof, self.actuator_dof, self.shm.name)
+
+    def __len__(self):
+        return int(self.header[RING_HEAD] - self.header[RING_TAIL])
+
+    def free(self) -> int:
+        return self.capacity - len(self)
+
+    # ----------------------------------------------------- producer side
+
+    def write(self, times: npt.ArrayLike, positions_cartesian: npt.ArrayLike, positions_actuator: npt.ArrayLike) -> int:
+        times = np.asarray(times)
+        count = min(len(times), self.free())
+        if count == 0:
+            return 0
+        head = int(self.header[RING_HEAD])
+        physical = (head + np.arange(count)) % self.capacity
+        self.times[physical] = times[:count]
+        self.positions_cartesian[physical] = np.asarray(positions_cartesian)[:count]
+        self.positions_actuator[physical] = np.asarray(positions_actuator)[:count]
+        # and only now can the consumer see them,
+        self.header[RING_HEAD] = head + count
+        return count
+
+    # ----------------------------------------------------- consumer side
+
+    # views of up to `count` of the oldest unconsumed pts, (times, cartesian, actuator)
+    # these don't wrap around the end of the buffer, so may be shorter than asked for,
+    # and they stay valid until consume() hands the slots back to the producer
+    def peek(self, count: int):
+        tail = int(self.header[RING_TAIL])
+        start = tail % self.capacity
+        count = min(count, len(self), self.capacity - start)
+        return (
+            self.times[start:start + count],
+            self.positions_cartesian[start:start + count],
+            self.positions_actuator[start:start + count]
+        )
+
+    def consume(self, count: int):
+        self.header[RING_TAIL] += min(count, len(self))
+
+    # ----------------------------------------------------- lifecycle
+
+    def close(self):
+        # drop our views before the buffer goes, else shm.close() complains
+        del self.header, self.scratch, self.times, self.positions_cartesian, self.positions_actuator
+        self.shm.close()
+        if self._owner:
+            self.shm.unlink()
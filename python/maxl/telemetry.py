@@ -0,0 +1,183 @@
+import bisect
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, List
+
+import numpy as np
+import numpy.typing as npt
+
+
+# a fixed-size ring of (time, value) samples, preallocated so that recording is cheap
+class MAXLTimeSeries:
+    def __init__(self, capacity: int = 4096):
+        self.capacity = capacity
+        self._times = np.zeros(capacity, dtype = np.int64)
+        self._values = np.zeros(capacity)
+        self._head = 0
+        self._count = 0
+
+    def __len__(self):
+        return min(self._count, self.capacity)
+
+    def record(self, time: int, value: float):
+        self._times[self._head] = time
+        self._values[self._head] = value
+        self._head = (self._head + 1) % self.capacity
+        self._count += 1
+
+    # returns (times, values), oldest first
+    def arrays(self):
+        if self._count < self.capacity:
+            return self._times[:self._head].copy(), self._values[:self._head].copy()
+        order = (self._head + np.arange(self.capacity)) % self.capacity
+        return self._times[order], self._values[order]
+
+    def last(self) -> float | None:
+        if self._count == 0:
+            return None
+        return float(self._values[self._head - 1])
+
+
+# log-bucketed histogram (a-la HDR), buckets are ~5% wide from 1 to max_value,
+# values below 1 (incl. negatives) land in the bottom bucket, but min / max are exact
+class MAXLHistogram:
+    def __init__(self, max_value: float = 1e7, buckets_per_decade: int = 48):
+        decades = int(np.ceil(np.log10(max_value)))
+        self._edges = np.logspace(0, decades, decades * buckets_per_decade + 1)
+        # (single values bisect a plain list, which is much cheaper than a numpy call on a scalar)
+        self._edges_list = self._edges.tolist()
+        self._counts = np.zeros(len(self._edges) + 1, dtype = np.int64)
+        self.count = 0
+        self.total = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def record(self, value: float):
+        self._counts[bisect.bisect_right(self._edges_list, value)] += 1
+        self.count += 1
+        self.total += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def record_many(self, values: npt.ArrayLike):
+        values = np.asarray(values, dtype = np.float64)
+        if values.size == 0:
+            return
+        np.add.at(self._counts, np.searchsorted(self._edges, values, side = 'right'), 1)
+        self.count += values.size
+        self.total += float(np.sum(values))
+        self.min = min(self.min, float(np.min(values)))
+        self.max = max(self.max, float(np.max(values)))
+
+    # upper edge of the bucket holding the p'th percentile (clipped to the exact min / max)
+    def percentile(self, p: float) -> float | None:
+        if self.count == 0:
+            return None
+        rank = int(np.ceil(p / 100 * self.count))
+        bucket = int(np.searchsorted(np.cumsum(self._counts), max(rank, 1)))
+        if bucket == 0:
+            return float(self.min)
+        upper = self._edges[min(bucket, len(self._edges) - 1)]
+        return float(np.clip(upper, self.min, self.max))
+
+    def reset(self):
+        self._counts[:] = 0
+        self.count = 0
+        self.total = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def summary(self) -> Dict[str, float | None]:
+        if self.count == 0:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "mean": self.total / self.count,
+            "min": float(self.min),
+            "p50": self.percentile(50),
+            "p99": self.percentile(99),
+            "p99.9": self.percentile(99.9),
+            "max": float(self.max),
+        }
+
+
+@dataclass
+class MAXLTelemetryEvent:
+    time_us: int
+    kind: str
+    source: str
+    message: str
+
+
+# everything MAXLCore knows about how well it is keeping up, all in microseconds:
+# - generation lag: how far behind the (now + gap) deadline each pt-gen pass ran
+# - tx slack: time between a pt's transmission and its own timestamp (-ve is late)
+# - rpc latency: round trip of each add-control-point(s) call, per actuator
+# - remote headroom: free slots in each actuator's MAXL queue, after each transmit
+# - events: i.e. replanning suppression (or budgeting), and actuator errors
+class MAXLTelemetry:
+    def __init__(self, actuator_names: List[str], remote_buffer_size: int, series_length: int = 4096, events_length: int = 256):
+        self.remote_buffer_size = remote_buffer_size
+
+        self.generation_lag = MAXLHistogram()
+        self.generation_lag_series = MAXLTimeSeries(series_length)
+        self.tx_slack = MAXLHistogram()
+        self.tx_slack_series = MAXLTimeSeries(series_length)
+        self.rpc_latency: Dict[str, MAXLHistogram] = {name: MAXLHistogram() for name in actuator_names}
+        self.remote_headroom = MAXLHistogram()
+        self.remote_headroom_series = MAXLTimeSeries(series_length)
+
+        self.replan_suppressions = 0
+        self.replan_budgetings = 0
+        self.events: Deque[MAXLTelemetryEvent] = deque(maxlen = events_length)
+        self._listeners: List[Callable[[MAXLTelemetryEvent], None]] = []
+
+    # ----------------------------------------------------- recording
+
+    def record_generation_lag(self, time: int, lag_us: int):
+        # -ve lag is just pt-gen running ahead, which we don't need resolution on
+        self.generation_lag.record(max(0, lag_us))
+        self.generation_lag_series.record(time, lag_us)
+
+    def record_tx(self, now: int, pt_times: npt.NDArray, interval_us: int):
+        slack = pt_times - now
+        self.tx_slack.record_many(slack)
+        self.tx_slack_series.record(now, float(np.min(slack)))
+        # everything we've sent up to the newest pt is sitting in the remote queue,
+        # bar what it has already ticked past,
+        remote_fill = (int(pt_times[-1]) - now) // interval_us + 1
+        headroom = self.remote_buffer_size - remote_fill
+        self.remote_headroom.record(headroom)
+        self.remote_headroom_series.record(now, headroom)
+
+    def record_rpc_latency(self, actuator_name: str, latency_us: int):
+        self.rpc_latency[actuator_name].record(latency_us)
+
+    def post_event(self, time_us: int, kind: str, source: str, message: str):
+        event = MAXLTelemetryEvent(time_us, kind, source, message)
+        self.events.append(event)
+        if kind == "replan_suppressed":
+            self.replan_suppressions += 1
+        elif kind == "replan_budgeted":
+            self.replan_budgetings += 1
+        for listener in self._listeners:
+            listener(event)
+
+    def add_listener(self, listener: Callable[[MAXLTelemetryEvent], None]):
+        self._listeners.append(listener)
+
+    # ----------------------------------------------------- querying
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "generation_lag_us": self.generation_lag.summary(),
+            "tx_slack_us": self.tx_slack.summary(),
+            "rpc_latency_us": {name: hist.summary() for name, hist in self.rpc_latency.items()},
+            "remote_headroom_pts": self.remote_headroom.summary(),
+            "remote_headroom_now": self.remote_headroom_series.last(),
+            "replan_suppressions": self.replan_suppressions,
+            "replan_budgetings": self.replan_budgetings,
+            "recent_events": [event.__dict__ for event in list(self.events)[-16:]],
+        }
@@ -1,3 +1,4 @@
+import math 
 from dataclasses import dataclass 
 from typing import Union
 
@@ -10,6 +11,13 @@ class GCodeLine:
     e_delta: float 
     target_velocity: float 
 
+# G2 (clockwise) / G3 arcs in xy, to x, y around center_x, center_y, (i.e. for the planner's goto_arc) 
+@dataclass 
+class GCodeArc(GCodeLine):
+    center_x: float 
+    center_y: float 
+    clockwise: bool 
+
 class ArgsDict:
     def __init__(self, d):
         self.d = d
@@ -80,6 +88,54 @@ class GCodeParser:
                         target_velocity = self.target_velocity 
                     )
 
+                case "G2" | "G3":
+                    start = list(self.position)
+                    motion_axes = [d.get_float("X"), d.get_float("Y"), d.get_float("Z")]
+                    e = d.get_float("E")
+                    f = d.get_float("F")
+                    delta_e = 0 
+                    clockwise = cmd == "G2"
+
+                    for a, axis in enumerate(motion_axes):
+                        if axis is not None:
+                            self.position[a] = axis 
+
+                    if f is not None:
+                        self.target_velocity = f
+
+                    if e is not None:
+                        delta_e = e - self.e_last
+                        self.e_last = e
+
+                    r = d.get_float("R")
+                    if r is not None:
+                        # the center is r from both ends, on the side that makes the shorter arc, 
+                        # (or the longer, w/ -ve r) 
+                        dx, dy = self.position[0] - start[0], self.position[1] - start[1]
+                        chord = math.hypot(dx, dy)
+                        if chord == 0:
+                            raise ValueError(f"G-code line {self.i_line - 1}: R-form arcs can't be full circles")
+                        h = math.sqrt(max(r * r - chord * chord / 4, 0))
+                        side = (-1 if clockwise else 1) * (-1 if r < 0 else 1)
+                        center_x = start[0] + dx / 2 - side * h * dy / chord 
+                        center_y = start[1] + dy / 2 + side * h * dx / chord 
+                    else:
+                        # I, J are offsets from the start, 
+                        center_x = start[0] + (d.get_float("I") or 0)
+                        center_y = start[1] + (d.get_float("J") or 0)
+
+                    return GCodeArc(
+                        line_num = self.i_line - 1, 
+                        x = self.position[0],
+                        y = self.position[1],
+                        z = self.position[2],
+                        e_delta = delta_e, 
+                        target_velocity = self.target_velocity, 
+                        center_x = center_x, 
+                        center_y = center_y, 
+                        clockwise = clockwise 
+                    )
+
                 case "G92":
                     e = d.get_float("E")
                     if e is not None:
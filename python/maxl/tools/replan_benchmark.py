@@ -0,0 +1,84 @@
+import time
+from typing import Dict
+
+import numpy as np
+import numpy.typing as npt
+
+from ..types import MAXLInterpolationIntervals
+from ..queue_planner import MAXLQueuePlanner, MAXLQueueConfig
+from ..queue_planner_functional import recalculate_queue
+
+# times replanning per added segment: from scratch (as every added segment used to), 
+# full (everything, but w/ cached junction limits), incremental and budgeted (incremental, w/ the
+# least time budget, as while pt-gen runs late),
+# with the lookahead queue held full (retiring the oldest as we add) like during a drawing
+# run with i.e. `python -m maxl.tools.replan_benchmark` from /python
+
+
+def make_planner(lookahead: int) -> MAXLQueuePlanner:
+    planner = MAXLQueuePlanner(MAXLQueueConfig(
+        axes = ['X', 'Y', 'Z'],
+        inertial_axes_count = 3,
+        max_accels = [10000, 10000, 1000],
+        max_vels = [10000, 10000, 1000],
+        interpolation_interval = MAXLInterpolationIntervals.INTERVAL_16384,
+        twin_to_real_gap_ms = 200,
+        lookahead_queue_length = lookahead,
+        junction_deviation = 0.75,
+        min_distance = 0.01,
+    ))
+    # we call recalculate_queue ourselves,
+    planner.do_recalculations = False
+    return planner
+
+
+# a contour-ish path: a spiral of short segments, w/ the odd sharp corner
+def make_path(count: int, seed: int = 0) -> npt.NDArray:
+    rng = np.random.default_rng(seed)
+    angles = np.cumsum(rng.uniform(0.02, 0.2, count))
+    radii = 20 + np.cumsum(rng.uniform(0, 0.05, count))
+    path = np.stack([radii * np.cos(angles), radii * np.sin(angles), np.zeros(count)], axis = -1)
+    corners = rng.random(count) < 0.05
+    path[corners, :2] += rng.normal(0, 5, (int(np.sum(corners)), 2))
+    return path
+
+
+def run(mode: str, path: npt.NDArray, lookahead: int, target_vel: float) -> npt.NDArray:
+    planner = make_planner(lookahead)
+    costs = []
+    for pt in path:
+        if len(planner.queue) >= lookahead:
+            planner.p_tail = planner.queue.popleft().p_end
+        planner._add_segment(pt, target_vel)
+        start = time.perf_counter_ns()
+        if mode == "scratch":
+            for seg in planner.queue:
+                seg.vj = None
+        recalculate_queue(
+            planner.queue, planner.junction_deviation, planner.max_accels,
+            full = mode not in ["incremental", "budgeted"], budget_us = 0 if mode == "budgeted" else None
+        )
+        costs.append(time.perf_counter_ns() - start)
+    return np.array(costs) / 1000
+
+
+def benchmark(count: int = 2000, lookahead: int = 64, target_vel: float = 200) -> Dict[str, Dict[str, float]]:
+    path = make_path(count)
+    results = {}
+    for mode in ["scratch", "full", "incremental", "budgeted"]:
+        costs = run(mode, path, lookahead, target_vel)
+        results[mode] = {
+            "mean_us": float(np.mean(costs)),
+            "p50_us": float(np.percentile(costs, 50)),
+            "p99_us": float(np.percentile(costs, 99)),
+            "max_us": float(np.max(costs)),
+        }
+    return results
+
+
+if __name__ == "__main__":
+    for lookahead in [16, 64, 256]:
+        results = benchmark(lookahead = lookahead)
+        print(f"lookahead {lookahead}:")
+        for name, stats in results.items():
+            print(f"  {name:>12}: " + ", ".join(f"{key} {value:8.1f}" for key, value in stats.items()))
@@ -1,116 +1,54 @@
-import numpy as np 
-from numba import jit
-
-@jit(nopython=True)
-def ccw(A, B, C):
-    return (C[1] - A[1]) * (B[0] - A[0]) > (B[1] - A[1]) * (C[0] - A[0])
-
-@jit(nopython=True)
-def is_intersecting(p1, p2, q1, q2):
-    return ccw(p1, q1, q2) != ccw(p2, q1, q2) and ccw(p1, p2, q1) != ccw(p1, p2, q2)
-
-@jit(nopython=True)
-def det(a, b):
-    return a[0] * b[1] - a[1] * b[0]
-
-@jit(nopython=True)
-def line_intersection(p1, p2, q1, q2):
-    x_diff = (p1[0] - p2[0], q1[0] - q2[0])
-    y_diff = (p1[1] - p2[1], q1[1] - q2[1])
-
-    div = det(x_diff, y_diff)
-    if div == 0:
-        return (np.nan, np.nan)  # Return invalid point if lines are parallel or collinear
-
-    d = (det(p1, p2), det(q1, q2))
-    x = det(d, x_diff) / div
-    y = det(d, y_diff) / div
-    return x, y
-
-@jit(nopython=True)
-def parameter_on_segment(p, q1, q2):
-    if q2[0] != q1[0]:  # If x-coordinates are not the same
-        return (p[0] - q1[0]) / (q2[0] - q1[0])
-    else:  # If x-coordinates are the same, use y-coordinates
-        return (p[1] - q1[1]) / (q2[1] - q1[1])
-
-@jit(nopython=True)
-def find_intersection(a_x, a_y, b_x, b_y):
-    for i in range(len(a_x) - 1):
-        p1 = (a_x[i], a_y[i])
-        p2 = (a_x[i + 1], a_y[i + 1])
-
-        for j in range(len(b_x) - 1):
-            q1 = (b_x[j], b_y[j])
-            q2 = (b_x[j + 1], b_y[j + 1])
-
-            if is_intersecting(p1, p2, q1, q2):
-                intersection = line_intersection(p1, p2, q1, q2)
-                if not np.isnan(intersection[0]) and not np.isnan(intersection[1]):
-                    p_a = parameter_on_segment(intersection, p1, p2)
-                    p_b = parameter_on_segment(intersection, q1, q2)
-                    return i, j, p_a, p_b
-    return -1, -1, np.nan, np.nan  # Return invalid indices and NaNs if no intersection
-
-# Example usage
-# a_x = np.array([0, 1, 2, 3], dtype=np.float64)
-# a_y = np.array([0, 1, 0, -1], dtype=np.float64)
-# b_x = np.array([0, 1, 2, 3], dtype=np.float64)
-# b_y = np.array([1, 0, -1, -2], dtype=np.float64)
-
-# result = find_intersection(a_x, a_y, b_x, b_y)
-# print(result)
+import numpy as np
+import numpy.typing as npt
+
+from .queue_planner_functional import (
+    torque_like_accel_time, torque_like_accel_distance, torque_like_brake_time, torque_like_brake_distance,
+    torque_like_max_exit_velocity, torque_like_max_entry_velocity
+)
 
 
 class TorqueLikeSegmentSolver:
     def __init__(self, max_static_accel, max_steadystate_velocity, target_velocity, time_step = 0.001):
-        self.max_accel = max_static_accel 
-        self.max_velocity = max_steadystate_velocity 
-        self.target_velocity = target_velocity 
-
-        self.time_step = time_step 
-
-        self._velocity = 0 
-        self._position = 0 
+        self.max_accel = max_static_accel
+        self.max_velocity = max_steadystate_velocity
+        self.target_velocity = target_velocity
 
-        # initializing these ahead-of the .solve call, 
-        self._fwds_times = np.arange(0, 10, self.time_step)
-        self._fwds_velos = np.zeros(self._fwds_times.shape)
-        self._fwds_posns = np.zeros(self._fwds_times.shape)
+        # only for integrate(), solves are closed-form
+        self.time_step = time_step
 
-        self._rev_times = np.arange(-10, 0, self.time_step)
-        self._rev_velos = np.zeros(self._rev_times.shape)
-        self._rev_posns = np.zeros(self._rev_times.shape)
+        self._velocity = 0
+        self._position = 0
 
-    # this thing approximates a linear torque curve a-la: 
+    # this thing approximates a linear torque curve a-la:
     #  `.   |
     #     `.|
-    #       |`.  < max_static_accel  (at zero velocity, -ves will be bigger) 
+    #       |`.  < max_static_accel  (at zero velocity, -ves will be bigger)
     #       |   `.
     #       |      `.
     # ------|---------x---
-    #                  ^ max_steadystate_velocity 
-    # these are not perfect, but do much better than simple "max_accel, max_v" trapezoids, 
+    #                  ^ max_steadystate_velocity
+    # these are not perfect, but do much better than simple "max_accel, max_v" trapezoids,
     # the linear plot in accel-vs-v leads to segments with curvature in the accel-vs-t plot,
-    # which can be fit perfectly with a quartic spline (!) 
+    # which can be fit perfectly with a quartic spline (!)
+    # ... and since accel is linear in velocity, dv/dt = a(v) is too, so flat-out accel and braking
+    # are exponentials (w/ time constant tau = max_velocity / max_accel) that we can solve exactly
 
     def get_min_max_accel(self, velocity: float):
         if velocity < 0:
-            span = velocity / self.max_velocity 
-            return - (1 + span) * self.max_accel, (1 - span) * self.max_accel # self.max_accel 
+            span = velocity / self.max_velocity
+            return - (1 + span) * self.max_accel, (1 - span) * self.max_accel # self.max_accel
         else:
-            span = velocity / self.max_velocity 
+            span = velocity / self.max_velocity
             return - (1 + span) * self.max_accel, (1 - span) * self.max_accel
-        
+
     def set_states(self, position: float, velocity: float):
-        self._position = position 
+        self._position = position
         self._velocity = velocity
 
-    # returns position, velocity 
+    # returns position, velocity
     def get_states(self):
         return self._position, self._velocity
-    
-    # TODO: integrate with RK4 if perf is punishing 
+
     # effort: float [-1, 1]
     def integrate(self, effort: float, time_step: float):
         effort = np.clip(effort, -1, 1)
@@ -118,82 +56,108 @@ class TorqueLikeSegmentSolver:
 
         effort_span = (effort + 1) / 2
 
-        self._accel = min_accel + effort_span * (max_accel - min_accel) 
+        self._accel = min_accel + effort_span * (max_accel - min_accel)
 
-        self._velocity += self._accel * time_step 
+        self._velocity += self._accel * time_step
 
-        # a bit of a quick-hack, we only do this going fwds, 
-        # so that reversals can intersect (!) 
+        # a bit of a quick-hack, we only do this going fwds,
+        # so that reversals can intersect (!)
         if time_step > 0:
             if self._velocity > self.target_velocity:
-                self._velocity = self.target_velocity 
+                self._velocity = self.target_velocity
+
+        self._position += self._velocity * time_step
 
-        self._position += self._velocity * time_step 
+        return self._velocity, self._position
 
-        return self._velocity, self._position 
-    
-    # solve from initial pos, vel to final pos, vel, 
+    # ----------------------------------------------------- solves
+
+    # solve from initial pos, vel to final pos, vel: flat-out accel (up to target_velocity,
+    # where we cruise) then flat-out braking... returns the time until we start braking,
+    # and the time spent braking
     def solve(self, p_i, v_i, p_f, v_f):
-        # all solved in +ve land, 
         if p_i < 0 or v_i < 0 or p_f < 0 or v_f < 0:
             raise ValueError("TorqueLikeSegmentSolver lives in +ve plane only for now!")
+        a0, v_ss = self.max_accel, self.max_velocity
+        distance = p_f - p_i
+        def ramps_distance(v_peak):
+            return torque_like_accel_distance(v_i, v_peak, a0, v_ss) + torque_like_brake_distance(v_peak, v_f, a0, v_ss)
+
+        # the slowest peak we could have is the faster end, and if even that doesn't fit, we can't do it,
+        lo = max(v_i, v_f)
+        if ramps_distance(lo) > distance * (1 + 1e-9) + 1e-12:
+            raise ValueError(f"TorqueLikeSegmentSolver can't make {v_f} from {v_i} in {distance}")
+
+        # we cruise at target_velocity if we'd get there, (we can only approach max_velocity),
+        # else the peak is where the two ramps meet, which both grow w/ it so we bisect for it
+        hi = min(self.target_velocity, v_ss * (1 - 1e-12))
+        if ramps_distance(hi) <= distance:
+            v_peak = hi
+        else:
+            while hi - lo > 1e-12 * v_ss:
+                mid = (lo + hi) / 2
+                if ramps_distance(mid) <= distance:
+                    lo = mid
+                else:
+                    hi = mid
+            v_peak = lo
+
+        cruise_distance = max(distance - ramps_distance(v_peak), 0)
+        cruise_time = cruise_distance / v_peak if v_peak > 0 else 0
+        forwards_time = torque_like_accel_time(v_i, v_peak, a0, v_ss) + cruise_time
+        stopping_time = torque_like_brake_time(v_peak, v_f, a0, v_ss)
+        return forwards_time, stopping_time
+
+    # as solve(), for arrays of segments at once, (a whole lookahead queue, say)
+    def solve_many(self, p_i: npt.ArrayLike, v_i: npt.ArrayLike, p_f: npt.ArrayLike, v_f: npt.ArrayLike):
+        p_i, v_i, p_f, v_f = [np.asarray(arg, dtype = np.float64) for arg in (p_i, v_i, p_f, v_f)]
+
+        # all solved in +ve land,
+        if np.any(p_i < 0) or np.any(v_i < 0) or np.any(p_f < 0) or np.any(v_f < 0):
+            raise ValueError("TorqueLikeSegmentSolver lives in +ve plane only for now!")
 
-        # (1) integrate forwards .. 
-        # 10s is a guess at maximum segment time, this will probably cause an error soon 
-        # TODO: initialize these once, not on every solve, if perf is punishing (and re-solving common)
-        fwds_max_vel = 0 
-        fwds_i = 0 
-
-        self.set_states(p_i, v_i) 
-
-        # TODO: could we hit this with some numba ?
-        for i in range(len(self._fwds_times)): #, t in enumerate(self._fwds_times):
-            self._fwds_velos[i], self._fwds_posns[i] = self.integrate(1, self.time_step)
-            if self._fwds_posns[i] >= p_f:
-                fwds_max_vel = self._fwds_velos[i] 
-                fwds_i = i 
-                # print(f"fwds: {fwds_i}")
-                break 
-
-        if fwds_i == 0:
-            raise Exception("TLSS failed to hit final position after 10s integration.")
-
-        # (2) integrate backwards 
-        rev_i = 0 
-
-        self.set_states(p_f, v_f)
-
-        for i in range(len(self._rev_times)): #, t in enumerate(self._rev_times):
-            self._rev_velos[i], self._rev_posns[i] = self.integrate(-1, - self.time_step) 
-            # warning that 0.1 maybe not big enough surplus here 
-            # to cross with fwds pass (esp. if mm/sec) 
-            if self._rev_velos[i] > fwds_max_vel + 0.1:
-                rev_i = i 
-                # print(f"rev: {rev_i}")
-                break 
-
-        if rev_i == 0:
-            raise Exception("TLSS failed to hit fwds_max_vel while backing up")
-
-        # flip, TODO: could probably figure how to not-flip, for perf ? 
-        rev_posns = self._rev_posns[:rev_i][::-1]
-        rev_times = self._rev_times[:rev_i][::-1]
-        rev_velos = self._rev_velos[:rev_i][::-1]
-
-        # (3) cross 'em, 
-        i, j, p_a, p_b = find_intersection(rev_posns, rev_velos, self._fwds_posns, self._fwds_velos)
-        exact_forwards_time = self._fwds_times[j] + self.time_step * p_b 
-        exact_stopping_time = 10 + rev_times[i] - self.time_step * p_a 
-        exact_total_time = exact_forwards_time + exact_stopping_time
-
-        # actually not totally sure what returns we'll need, 
-        return exact_forwards_time, exact_stopping_time 
-
-        # return rev_times[i - 1], self._fwds_times[i - 1] 
-
-
+        a0, v_ss = self.max_accel, self.max_velocity
+        distance = p_f - p_i
+        def ramps_distance(v_peak):
+            return torque_like_accel_distance(v_i, v_peak, a0, v_ss) + torque_like_brake_distance(v_peak, v_f, a0, v_ss)
+
+        # the slowest peak we could have is the faster end, and if even that doesn't fit, we can't do it,
+        v_lo = np.maximum(v_i, v_f)
+        if np.any(ramps_distance(v_lo) > distance * (1 + 1e-9) + 1e-12):
+            raise ValueError("TorqueLikeSegmentSolver can't make some v_f from v_i in their distance")
+
+        # we cruise at target_velocity if we'd get there, (we can only approach max_velocity),
+        # else the peak is where the two ramps meet, which both grow w/ it so we bisect for it
+        v_hi = np.full(v_lo.shape, min(self.target_velocity, self.max_velocity * (1 - 1e-12)), dtype = np.float64)
+        cruising = ramps_distance(v_hi) <= distance
+        v_peak = np.where(cruising, v_hi, v_lo)
+        if not np.all(cruising):
+            lo, hi = v_lo[~cruising], v_hi[~cruising]
+            d, vi, vf = distance[~cruising], v_i[~cruising], v_f[~cruising]
+            while np.max(hi - lo) > 1e-12 * self.max_velocity:
+                mid = (lo + hi) / 2
+                fits = torque_like_accel_distance(vi, mid, a0, v_ss) + torque_like_brake_distance(mid, vf, a0, v_ss) <= d
+                lo[fits] = mid[fits]
+                hi[~fits] = mid[~fits]
+            v_peak[~cruising] = lo
+
+        cruise_distance = np.maximum(distance - ramps_distance(v_peak), 0)
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            cruise_time = np.where(v_peak > 0, cruise_distance / v_peak, 0)
+        forwards_times = torque_like_accel_time(v_i, v_peak, a0, v_ss) + cruise_time
+        stopping_times = torque_like_brake_time(v_peak, v_f, a0, v_ss)
+        return forwards_times, stopping_times
+
+    # the fastest we can arrive at p_f, accelerating flat-out from p_i, v_i
     def solve_max_vf(self, p_i, v_i, p_f):
-        pass 
+        if p_f < p_i or v_i < 0:
+            raise ValueError("TorqueLikeSegmentSolver lives in +ve plane only for now!")
+        v_f = torque_like_max_exit_velocity(v_i, p_f - p_i, self.max_accel, self.max_velocity)
+        return min(v_f, self.target_velocity)
 
+    # and the fastest we can be going at p_i, and still brake to v_f by p_f
     def solve_max_vi(self, p_i, p_f, v_f):
-        pass 
\ No newline at end of file
+        if p_f < p_i or v_f < 0:
+            raise ValueError("TorqueLikeSegmentSolver lives in +ve plane only for now!")
+        v_i = torque_like_max_entry_velocity(v_f, p_f - p_i, self.max_accel, self.max_velocity)
+        return min(v_i, self.target_velocity)
@@ -0,0 +1,123 @@
+import asyncio
+from collections import deque
+from typing import Callable, Deque, List, Tuple
+
+from osap.utils.time_utils import get_microsecond_timestamp
+
+# mirrors MAXL_QUEUE_SIZE in the firmware
+MAXL_SIMULATED_QUEUE_SIZE = 128
+
+# a stand-in for a MAXL actuator (i.e. MAXLStepper) that runs without firmware:
+# it implements the same rpc-ish API, keeps a point queue with the same
+# continuity / overfull / starvation rules as maxl.cpp, and counts calls,
+# so that MAXLCore's transmit path can be exercised (and measured) on a desk
+class MAXLSimulatedActuator:
+    def __init__(self, device_name: str,
+                 batch_size: int = 5,
+                 rpc_latency_us: int = 0,
+                 get_time_us: Callable[[], int] = get_microsecond_timestamp,
+                 record_stream: bool = False):
+        self.device_name = device_name
+        self.maxl_batch_size = batch_size
+        self.rpc_latency_us = rpc_latency_us
+        self.get_time_us = get_time_us
+        self.record_stream = record_stream
+
+        self._interval_bits = 0
+        self._queue: Deque[Tuple[int, float]] = deque()
+        self._stream_active = False
+        self._last_pos = 0.0
+        self._error_message = ""
+        self._error_flag = False
+
+        # stats,
+        self.rpc_count = 0
+        self.points_received = 0
+        self.errors: List[str] = []
+        # every accepted (time, point), when record_stream is set
+        self.stream: List[Tuple[int, float]] = []
+
+    async def begin(self):
+        return
+
+    async def maxl_set_interval(self, intervalNumBits: int):
+        await self._rpc()
+        self._interval_bits = intervalNumBits
+
+    async def maxl_add_control_point(self, time: int, point: float, flags: int):
+        await self._rpc()
+        self._add_point(time, point, flags)
+
+    async def maxl_add_control_points(self, time: int, points: List[float], flags: int):
+        if len(points) > self.maxl_batch_size:
+            raise ValueError(f"can only batch {self.maxl_batch_size} pts per call, not {len(points)}")
+        await self._rpc()
+        for i, point in enumerate(points):
+            self._add_point(time + (i << self._interval_bits), point, flags if i == 0 else 0)
+
+    async def maxl_get_error_message(self) -> str:
+        await self._rpc()
+        self._consume(self.get_time_us())
+        if self._error_flag:
+            self._error_flag = False
+            return self._error_message
+        return ""
+
+    async def maxl_get_position(self) -> Tuple[int, float]:
+        await self._rpc()
+        now = self.get_time_us()
+        self._consume(now)
+        return now, self._last_pos
+
+    # there's no switch to hit, so homing finds it right away
+    async def get_limit_state(self) -> Tuple[int, bool]:
+        await self._rpc()
+        return self.get_time_us(), True
+
+    def get_queue_length(self) -> int:
+        self._consume(self.get_time_us())
+        return len(self._queue)
+
+    # ----------------------------------------------------- internals
+
+    async def _rpc(self):
+        self.rpc_count += 1
+        if self.rpc_latency_us > 0:
+            await asyncio.sleep(self.rpc_latency_us / 1000000)
+
+    def _post_error(self, msg: str):
+        self._error_message = msg
+        self._error_flag = True
+        self.errors.append(msg)
+
+    def _add_point(self, time: int, point: float, flags: int):
+        self._consume(self.get_time_us())
+        self.points_received += 1
+        if len(self._queue) + 2 > MAXL_SIMULATED_QUEUE_SIZE:
+            self._post_error("overfull")
+            return
+        elif flags & 0b01:
+            # stream start resets the queue,
+            self._queue.clear()
+            self._stream_active = True
+            self._post_error("startup")
+        elif len(self._queue) > 0 and self._queue[-1][0] + (1 << self._interval_bits) != time:
+            self._post_error(f"missed segment, {self._queue[-1][0]} {time}")
+            return
+
+        self._queue.append((time, point))
+        if self.record_stream:
+            self.stream.append((time, point))
+
+    # drop points that the (virtual) evaluator has ticked past,
+    def _consume(self, now: int):
+        if not self._stream_active or len(self._queue) == 0:
+            return
+        if self._queue[0][0] > now:
+            return
+        while len(self._queue) > 1 and self._queue[1][0] <= now:
+            if len(self._queue) <= 4:
+                self._post_error(f"STARVED @ {now}")
+                return
+            self._queue.popleft()
+        self._last_pos = self._queue[0][1]
@@ -1,6 +1,9 @@
-from typing import cast, Tuple 
+from typing import cast, Tuple, List 
 from osap.osap import OSAP 
 
+# the batched add-points rpc carries this many pts (rpc args max out at 8) 
+MAXL_BATCH_MAX_POINTS = 5 
+
 class MAXLStepper:
     def __init__(self, osap: OSAP, device_name: str):
         self.device_name = device_name 
@@ -20,6 +23,15 @@ class MAXLStepper:
             self._maxl_get_error_message_rpc,
             self._maxl_get_position_rpc
         ]
+
+        # older firmwares don't have the batched rpc, so we fall back to one-pt-per-call 
+        try:
+            self._maxl_add_control_points_rpc = osap.rpc_caller(device_name, "maxl_addControlPoints")
+            self.callers.append(self._maxl_add_control_points_rpc)
+            self.maxl_batch_size = MAXL_BATCH_MAX_POINTS 
+        except AttributeError:
+            self._maxl_add_control_points_rpc = None 
+            self.maxl_batch_size = 1 
         
     async def begin(self):
         for caller in self.callers:
@@ -46,6 +58,16 @@ class MAXLStepper:
         await self._maxl_add_control_point_rpc.call(time, point, flags)
         return
     
+    # points are consecutive (one interval apart) starting at `time`, flags apply to the first 
+    async def maxl_add_control_points(self, time: int, points: List[float], flags: int):
+        if self._maxl_add_control_points_rpc is None:
+            raise Exception(f"{self.device_name} doesn't implement maxl_addControlPoints, use maxl_add_control_point")
+        if len(points) > MAXL_BATCH_MAX_POINTS:
+            raise ValueError(f"can only batch {MAXL_BATCH_MAX_POINTS} pts per call, not {len(points)}")
+        padded = list(points) + [0.0] * (MAXL_BATCH_MAX_POINTS - len(points))
+        await self._maxl_add_control_points_rpc.call(time, len(points), flags, *padded)
+        return
+    
     async def maxl_get_error_message(self) -> str:
         result = await self._maxl_get_error_message_rpc.call()
         return cast(str, result)
@@ -6,21 +6,53 @@ import numpy.typing as npt
 from osap.osap import OSAP 
 
 from modules.maxl_stepper import MAXLStepper 
+from modules.maxl_simulated import MAXLSimulatedActuator 
 from modules.servo_thing import ServoThing
 
 from maxl.types import MAXLInterpolationIntervals 
 from maxl.core import MAXLCore, MAXLCoreConfig 
 from maxl.queue_planner import MAXLQueuePlanner, MAXLQueueConfig 
+from maxl.planner_process import MAXLPlannerProcess 
 
 # 30 teeth, 2mm per tooth
 xy_rpu = 1 / 60
 
 xy_accels = 10000
 xy_max_rates = 10000
+# set this (mm/s^3) to run jerk-limited (s-curve) moves, i.e. with a higher xy_accels 
+xy_jerks = None 
+# or this (mm/s), where the steppers run out of torque, to have accel fall off w/ speed from 
+# xy_accels at standstill (a la maxl/torque_like_solver.py) 
+xy_steadystate_rates = None 
+# and this to round off corners in xy w/ arcs (within the junction deviation) that the pen runs at 
+# constant speed, rather than slowing into each one (pen lifts on z stay sharp) 
+xy_blend_corners = False 
+
+y_correct = np.sin(np.deg2rad(25))
+
+# works on one pt (3,) or a stack of 'em (n, 3), 
+# (at module level so that a planner process can pickle it) 
+def axes_to_actuators(axes_pts):
+    axes_pts = np.asarray(axes_pts)
+    x, y, z = axes_pts[..., 0], axes_pts[..., 1], axes_pts[..., 2]
+
+    # it's the same as corexy ? 
+    return np.stack([
+        xy_rpu * (x + y * y_correct) / 2,
+        xy_rpu * (x - y * y_correct) / 2,
+        z
+    ], axis = -1)
 
 class VVelocityMachineMotion:
-    def __init__(self, osap: OSAP, interpolation_interval: MAXLInterpolationIntervals, twin_to_real_ms: int, extents):
+    # with dry_run, osap is a maxl.dry_run.MAXLVirtualClock and the motors are simulated, 
+    # with planner_process, the queue planner (and pt-gen) run in their own process 
+    def __init__(self, osap: OSAP, interpolation_interval: MAXLInterpolationIntervals, twin_to_real_ms: int, extents, dry_run: bool = False, planner_process: bool = False):
         self.osap = osap 
+        self.dry_run = dry_run 
+        self.planner_process = planner_process 
+        if dry_run and planner_process:
+            # the planner process runs on real time, which a virtual clock would outrun 
+            raise ValueError("dry runs can't use a planner process")
 
         self.interpolation_interval = interpolation_interval
         self.twin_to_real_ms = twin_to_real_ms
@@ -32,10 +64,8 @@ class VVelocityMachineMotion:
         self._motor_b = None
         self._low_fet = None 
 
-        self._y_correct = np.sin(np.deg2rad(25))
-
         # xy accels are: 100 for clean drawings, 500 for speed, 1500 for ludicrous 
-        self.queue_planner = MAXLQueuePlanner(MAXLQueueConfig(
+        queue_config = MAXLQueueConfig(
             axes = ['X', 'Y', 'Z'],
             inertial_axes_count = 3, 
             max_accels = [xy_accels, xy_accels, 1000],
@@ -45,7 +75,15 @@ class VVelocityMachineMotion:
             lookahead_queue_length = 64,
             junction_deviation = 0.75,
             min_distance = 0.01,
-        ))
+            merge_tolerance = 0.02,
+            max_jerks = None if xy_jerks is None else [xy_jerks, xy_jerks, 100000],
+            max_steadystate_vels = None if xy_steadystate_rates is None else [xy_steadystate_rates, xy_steadystate_rates, 10000],
+            blend_axes_count = 2 if xy_blend_corners else 0,
+        )
+        if self.planner_process:
+            self.queue_planner = MAXLPlannerProcess(queue_config, axes_to_actuators, 3)
+        else:
+            self.queue_planner = MAXLQueuePlanner(queue_config)
     
 
     def system_graph(self, time: int):
@@ -55,31 +93,48 @@ class VVelocityMachineMotion:
 
         # print(F"{axes_pt[0]:.2f}, {axes_pt[1]:.2f}")
 
-        # it's the same as corexy ? 
-        actu_pts = [
-            xy_rpu * (axes_pt[0] + axes_pt[1] * self._y_correct) / 2,
-            xy_rpu * (axes_pt[0] - axes_pt[1] * self._y_correct) / 2,
-            axes_pt[2]
-        ]
-
         # returning (axes, actuator)
-        return axes_pt, actu_pts
+        return axes_pt, self._axes_to_actuators(axes_pt)
+
+    # batch-mode system_graph: a run of times in, (len(times), 3) axes and actuator pts out 
+    def system_graph_many(self, times):
+        axes_pts = self.queue_planner.on_new_control_points(times)
+        return axes_pts, self._axes_to_actuators(axes_pts)
+
+    def _axes_to_actuators(self, axes_pts):
+        return axes_to_actuators(axes_pts)
     
 
     async def begin(self):
 
-        self._motor_a = MAXLStepper(self.osap, "motor_a")
-        self._motor_b = MAXLStepper(self.osap, "motor_b")
+        if self.dry_run:
+            get_time_us = self.osap.get_system_microseconds 
+            self._motor_a = MAXLSimulatedActuator("motor_a", get_time_us = get_time_us, record_stream = True)
+            self._motor_b = MAXLSimulatedActuator("motor_b", get_time_us = get_time_us, record_stream = True)
+        else:
+            self._motor_a = MAXLStepper(self.osap, "motor_a")
+            self._motor_b = MAXLStepper(self.osap, "motor_b")
         self._low_fet = None # LowFet(self.osap, "low_fet")
 
+        if self.planner_process:
+            # the planner hands over finished pts, so it is our graph 
+            await asyncio.to_thread(self.queue_planner.start)
+            graph, graph_many = self.queue_planner.graph, self.queue_planner.graph_many 
+        else:
+            graph, graph_many = self.system_graph, self.system_graph_many 
+
         self._maxl_core = MAXLCore(self.osap, MAXLCoreConfig(
             actuators = [self._motor_a, self._motor_b, self._low_fet],
             actuator_currents = [0.5, 0.5, 0.2],
             interpolation_interval = self.interpolation_interval, 
             twin_to_real_gap_ms = self.twin_to_real_ms,
             history_length_ms = self.history_length_ms, 
-            graph = self.system_graph, 
-            print_point_transmits = False  
+            graph = graph, 
+            graph_many = graph_many, 
+            generation_batch_size = 4, 
+            print_point_transmits = False,
+            transmit_batch_size = 5, 
+            transmit_batch_deadline_ms = 40, 
         ), self.queue_planner)
 
         self._maxl_core._do_unsafe_recalculations = False 
@@ -96,6 +151,8 @@ class VVelocityMachineMotion:
             await self._low_fet.set_gate(0)
         if self._maxl_core is not None: 
             await self._maxl_core.shutdown() 
+        if self.planner_process:
+            self.queue_planner.stop() 
 
     async def home(self):
         home_rate = 200
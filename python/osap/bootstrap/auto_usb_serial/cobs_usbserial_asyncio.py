@@ -11,6 +11,8 @@ class CobsUsbSerial:
         self.on_data_callable = None
         self.name = port
         self.type_name = "cobsUSBSerial"
+        # sleep when the line is quiet, rather than spinning 
+        self.idle_sleep_us = 500
 
     def send(self, data: bytes):
         data_enc = cobs.encode(data) + b"\x00"
@@ -30,6 +32,21 @@ class CobsUsbSerial:
         else:
             self.buffer += byte
 
+    # drains every byte that's waiting, returns whole packets and the count of bytes read
+    def read_packets(self):
+        packets = []
+        waiting = self.ser.in_waiting
+        if waiting == 0:
+            return packets, 0
+        for byte in self.ser.read(waiting):
+            if byte == 0:
+                if len(self.buffer) > 0:
+                    packets.append(bytearray(cobs.decode(self.buffer)))
+                    self.buffer = bytearray()
+            else:
+                self.buffer.append(byte)
+        return packets, waiting
+
     def is_open(self):
         return True
 
@@ -50,7 +67,11 @@ class CobsUsbSerial:
     # loops forever,
     async def run(self):
         while True:
-            bts = self.read()
-            if bts and self.on_data_callable is not None:
-                self.on_data_callable(bts)
-            await asyncio.sleep(0)
+            packets, num_bytes = self.read_packets()
+            if self.on_data_callable is not None:
+                for bts in packets:
+                    self.on_data_callable(bts)
+            if num_bytes == 0:
+                await asyncio.sleep(self.idle_sleep_us / 1000000)
+            else:
+                await asyncio.sleep(0)
@@ -43,6 +43,9 @@ class Runtime:
         self.loop_timer = False # ? 
         # quicky on/off switch for time sync, for a debug task:
         self._answer_time_reqs = True 
+        # when a loop pass finds nothing to service, we sleep this long 
+        # rather than spinning (asyncio rounds to ~1ms on most platforms) 
+        self.idle_sleep_us = 500 
 
         # at the 0th port, we have our internal DNS 
         self.local_dns = NetResponder(self) 
@@ -239,8 +242,11 @@ class Runtime:
 
                 self.handle_packet(packet)
 
-            # (4) sleep / redux 
-            await asyncio.sleep(0) 
+            # (4) sleep / redux, idling if we were idle 
+            if len(packets) == 0:
+                await asyncio.sleep(self.idle_sleep_us / 1000000)
+            else:
+                await asyncio.sleep(0) 
 
     async def run(self):
         # setup and then run loop
@@ -4,12 +4,14 @@ import warnings
 sys.path.insert(0, os.path.dirname(__file__))
 
 import cv2
+import time
 import asyncio
 import traceback
 import numpy as np
 from osap.osap import OSAP
 from osap.bootstrap.auto_usb_serial.auto_usb_serial import AutoUSBPorts
 from maxl.types import MAXLInterpolationIntervals 
+from maxl.dry_run import get_virtual_clock, get_dry_run_report, get_dry_run_streams
 from modules.vvelocity_motion import VVelocityMachineMotion
 from modules.servo_patch import ServoPatch
 from svg import svg_tools
@@ -31,7 +33,9 @@ class PlotterController:
             self, 
             draw_rate: int = 80, 
             jog_rate: int = 100,
-            machine_extents = [235, 305]
+            machine_extents = [235, 305],
+            dry_run: bool = False,
+            planner_process: bool = False
         ):
         self.osap = None
         self.machine = None
@@ -42,10 +46,18 @@ class PlotterController:
         self.machine_extents = machine_extents
         self.servo_patch = None
         self.pen_position = 0
+        # dry runs have no hardware, and must be started from inside maxl.dry_run.run_dry()
+        self.dry_run = dry_run
+        self._dry_run_start = None
+        # run the motion planner in its own process, away from i.e. a web server's work
+        self.planner_process = planner_process
 
     async def start(self):
         if self.started:
             return
+        if self.dry_run:
+            await self._start_dry_run()
+            return
         try:
             self.osap = OSAP("py-printer")
             loop = asyncio.get_event_loop()
@@ -57,7 +69,7 @@ class PlotterController:
             system_map = await self.osap.netrunner.update_map()
             system_map.print()
             await self.osap.netrunner.await_time_settle(print_updates=True)
-            self.machine = VVelocityMachineMotion(self.osap, system_interpolation_interval, system_twin_to_real_ms, extents = self.machine_extents)
+            self.machine = VVelocityMachineMotion(self.osap, system_interpolation_interval, system_twin_to_real_ms, extents = self.machine_extents, planner_process = self.planner_process)
             await self.machine.begin()
 
             self.servo_patch = ServoPatch(self.osap, "servo_patch")
@@ -76,6 +88,16 @@ class PlotterController:
             await self.shutdown()
             raise
 
+    async def _start_dry_run(self):
+        # the virtual clock stands in for osap, 
+        self.osap = get_virtual_clock()
+        self.machine = VVelocityMachineMotion(self.osap, system_interpolation_interval, system_twin_to_real_ms, extents = self.machine_extents, dry_run = True)
+        await self.machine.begin()
+        await self.goto([0,0,0], self.draw_rate)
+        await self.flush()
+        self._dry_run_start = (self.osap.get_system_microseconds(), time.perf_counter())
+        self.started = True
+
     async def home(self):
         if not self.machine:
             raise RuntimeError("Machine not started")
@@ -110,6 +132,56 @@ class PlotterController:
             warnings.warn("pen position can change only with goto_and_wait")
         await self.machine.queue_planner.goto_via_queue(position, rate)
     
+    async def goto_path(self, points, rate=None, offline=False):
+        """Move through a polyline via the queue (non-blocking).
+        
+        Args:
+            points: (N, 3) or (N, 4) array of positions, visited in order
+            rate: Movement rate. If None, uses self.draw_rate
+            offline: Plan the whole path at once, for globally time-optimal
+                speeds, rather than through the lookahead window. The path
+                starts and ends stopped
+        
+        Queues every segment of the path in bulk, with one replan per chunk
+        of the lookahead queue, rather than one goto() per point. Returns once
+        the last chunk is queued; use flush() to wait for completion.
+        """
+        if not self.machine:
+            raise RuntimeError("Machine not started")
+        if rate is None:
+            rate = self.draw_rate
+        points = np.asarray(points, dtype=np.float64)
+        if len(points) == 0:
+            return
+        if np.any(points[:, 2] != self.pen_position):
+            warnings.warn("pen position can change only with goto_and_wait")
+        if offline:
+            await self.machine.queue_planner.goto_offline(points, rate)
+        else:
+            await self.machine.queue_planner.goto_many(points, rate)
+    
+    async def goto_arc(self, position, center, clockwise=False, rate=None):
+        """Move along a circular arc in x/y via the queue (non-blocking).
+        
+        Args:
+            position: End position as [x, y, z] or [x, y, z, e]. If it is the
+                current position, the arc is a full circle
+            center: Center of the arc, as for position (only x and y are used)
+            clockwise: Turn clockwise (as G2) rather than counter-clockwise (G3)
+            rate: Movement rate. If None, uses self.draw_rate
+        
+        The arc is queued as a single move at (up to) constant speed, limited
+        by its centripetal acceleration, rather than as a run of short chords
+        that each slow down for their own corner.
+        """
+        if not self.machine:
+            raise RuntimeError("Machine not started")
+        if rate is None:
+            rate = self.draw_rate
+        if position[2] != self.pen_position:
+            warnings.warn("pen position can change only with goto_and_wait")
+        await self.machine.queue_planner.goto_arc(position, center, clockwise, rate)
+    
     async def goto_and_wait(self, position, rate=None):
         """Move to a position and wait for completion.
         
@@ -126,10 +198,77 @@ class PlotterController:
         await self.machine.queue_planner.goto_and_await(position, rate)
         if position[2] != self.pen_position:
             self.pen_position = position[2]
-            if self.pen_position == 0: await self.servo_patch.pen_up()
-            else: await self.servo_patch.pen_down()
+            if self.servo_patch is not None:
+                if self.pen_position == 0: await self.servo_patch.pen_up()
+                else: await self.servo_patch.pen_down()
             await asyncio.sleep(1)
 
+    def get_telemetry(self):
+        """Summarize motion-system telemetry.
+        
+        Returns a dict of histograms (point-generation lag, transmit slack,
+        per-actuator RPC latency, remote buffer headroom), replan suppression
+        and budgeting counts and recent events, as recorded by the MAXL core.
+        """
+        if not self.machine or self.machine._maxl_core is None:
+            raise RuntimeError("Machine not started")
+        return self.machine._maxl_core.telemetry.summary()
+
+    def set_feed_override(self, factor):
+        """Speed up or slow down the motion that's queued, while it runs.
+        
+        The planned timeline is played back faster or slower, without
+        replanning, and the change is ramped in within the planner's
+        acceleration limits.
+        
+        Args:
+            factor: Multiplier on planned speeds, i.e. 0.5 for half speed,
+                capped at the planner's max_feed_override (1.0 unless the
+                planner is configured with headroom above its limits).
+                Accelerations along the path scale with its square
+        
+        Returns the override that was applied.
+        """
+        if not self.machine:
+            raise RuntimeError("Machine not started")
+        self.machine.queue_planner.feed_override = factor
+        return self.machine.queue_planner.feed_override
+
+    async def get_planner_profile(self, reset=False):
+        """Summarize the motion planner's CPU costs.
+        
+        Args:
+            reset: Clear the planner's profilers once they have been read
+        
+        Returns a dict of timing histograms (count, mean, min, p50, p99,
+        p99.9 and max, in microseconds) for adding segments, generating
+        control points and replanning, for the replan's junction, forward and
+        reverse passes and for block making, plus replan times binned by the
+        length of the queue they ran over.
+        """
+        if not self.machine:
+            raise RuntimeError("Machine not started")
+        return await self.machine.queue_planner.get_profile_report(reset)
+
+    def get_dry_run_report(self, include_streams=False):
+        """Summarize a dry run, from the end of start() until now.
+        
+        Args:
+            include_streams: Also return each motor's full control-point
+                stream, as (n, 2) arrays of [time_us, position]
+        
+        Returns a dict with the predicted job time, the real time it took to
+        simulate, per-motor point counts and errors, planner CPU costs and
+        the MAXL telemetry summary.
+        """
+        if not self.dry_run or not self.started:
+            raise RuntimeError("Dry run not started")
+        start_us, start_s = self._dry_run_start
+        report = get_dry_run_report(self.machine._maxl_core, start_us, start_s)
+        if include_streams:
+            report["streams"] = get_dry_run_streams(self.machine._maxl_core)
+        return report
+
     async def shutdown(self):
         try:
             if self.machine is not None:
@@ -146,7 +285,7 @@ class PlotterController:
                     pass
                 self.loop_task = None
             # dissolve links from OSAP and close serials
-            if self.osap is not None:
+            if self.osap is not None and not self.dry_run:
                 for link in list(self.osap.runtime.links):
                     if link is not None:
                         try:
@@ -1,7 +1,7 @@
 import os
 import sys
 import asyncio
-from fastapi import FastAPI, UploadFile, File, Form
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import HTMLResponse
 from typing import Dict, Any, List, Tuple
@@ -12,6 +12,7 @@ import matplotlib.pyplot as plt
 import requests
 import matplotlib.pyplot as plt
 
+from maxl.dry_run import run_dry
 from run_plotter import PlotterController
 from utils import get_image_url, get_xys, scale_paths
 
@@ -25,7 +26,8 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-controller = PlotterController(jog_rate=300)
+# image work & request handling share this process, so the planner gets its own
+controller = PlotterController(jog_rate=300, planner_process=True)
 
 @app.get("/", response_class=HTMLResponse)
 async def index() -> str:
@@ -148,6 +150,16 @@ async def api_stop() -> Dict[str, Any]:
 async def api_status() -> Dict[str, Any]:
     return {"started": controller.started}
 
+@app.post("/api/feed_override")
+async def api_feed_override(factor: float) -> Dict[str, Any]:
+    if not factor > 0:
+        raise HTTPException(status_code=400, detail=f"feed override should be > 0, not {factor}")
+    return {"status": "ok", "feed_override": controller.set_feed_override(factor)}
+
+@app.post("/api/planner_profile")
+async def api_planner_profile(reset: bool = False) -> Dict[str, Any]:
+    return await controller.get_planner_profile(reset)
+
 @app.post("/api/prompt")
 async def api_prompt(payload: Dict[str, Any]) -> Dict[str, Any]:
     prompt = payload.get("prompt", "")
@@ -182,7 +194,33 @@ async def api_image(file: UploadFile = File(...)) -> Dict[str, Any]:
     await _queue_points(pts)
     return {"status": "ok", "points": len(pts)}
 
-async def _queue_points(points: List[List[Tuple[float, float]]]):
+@app.post("/api/estimate")
+async def api_estimate(file: UploadFile = File(...)) -> Dict[str, Any]:
+    data = await file.read()
+    arr = np.frombuffer(data, dtype=np.uint8)
+    img = cv2.imdecode(arr, cv2.IMREAD_COLOR)
+    xys = get_xys(img)
+    extent = min(controller.machine_extents)
+    pts = scale_paths(xys, extent)
+    pts = [[(0, 0), (235, 0), (235, 235), (0, 235)]] + pts
+
+    # replay the job on a simulated machine, off of this loop 
+    report = await asyncio.to_thread(_dry_run_points, pts)
+    return {"status": "ok", "points": len(pts), **report}
+
+def _dry_run_points(points: List[List[Tuple[float, float]]]) -> Dict[str, Any]:
+    async def job(clock):
+        dry = PlotterController(draw_rate=controller.draw_rate, jog_rate=controller.jog_rate, machine_extents=controller.machine_extents, dry_run=True)
+        await dry.start()
+        try:
+            # (_queue_points closes contours in place)
+            await _queue_points([list(contour) for contour in points], dry)
+            return dry.get_dry_run_report()
+        finally:
+            await dry.shutdown()
+    return run_dry(job)
+
+async def _queue_points(points: List[List[Tuple[float, float]]], controller: PlotterController = controller):
     # pen up
     await controller.goto_and_wait([0,0,0], controller.draw_rate)
     for contour in points:
@@ -190,14 +228,14 @@ async def _queue_points(points: List[List[Tuple[float, float]]]):
         point = contour[0]
         await controller.goto_and_wait([point[0], point[1], 0], controller.draw_rate)
         await controller.goto_and_wait([point[0], point[1], 1], controller.draw_rate)
-        for point in contour:
-            x, y = point
-            if 0 <= x <= 235 and 0 <= y <= 235:
-                point = [point[0], point[1], 1]
-                await controller.goto(point, controller.draw_rate)
-            else:
-                print(f"WARNING: Point ({x}, {y}) is outside trapezoid bounds")
-                continue
+        xys = np.asarray(contour, dtype=np.float64).reshape(-1, 2)
+        inside = np.all((xys >= 0) & (xys <= 235), axis=1)
+        for x, y in xys[~inside]:
+            print(f"WARNING: Point ({x}, {y}) is outside trapezoid bounds")
+        path = np.column_stack([xys[inside], np.ones(int(np.sum(inside)))])
+        # (each contour is drawn from and to a stop, so we can plan it whole)
+        await controller.goto_path(path, controller.draw_rate, offline=True)
+        point = contour[-1]
         await controller.goto_and_wait([point[0], point[1], 0], controller.draw_rate)
     
     await controller.goto_origin()
@@ -0,0 +1,93 @@
+import asyncio
+
+import numpy as np
+
+from maxl.queue_planner import MAXLQueuePlanner, MAXLQueueConfig
+from maxl.queue_planner_functional import MAXLPlannedPath
+from maxl.types import MAXLInterpolationIntervals
+
+# run with i.e. `python -m pytest tests` from /python
+
+
+def make_planner(**kwargs) -> MAXLQueuePlanner:
+    return MAXLQueuePlanner(MAXLQueueConfig(
+        axes = ['X', 'Y', 'Z'],
+        inertial_axes_count = 3,
+        max_accels = [1000, 1000, 1000],
+        max_vels = [200, 200, 200],
+        interpolation_interval = MAXLInterpolationIntervals.INTERVAL_16384,
+        twin_to_real_gap_ms = 200,
+        lookahead_queue_length = 64,
+        junction_deviation = 0.5,
+        min_distance = 0.01,
+        **kwargs
+    ))
+
+
+# renders the queue out, a control pt per ms, until it's empty
+def render(planner: MAXLQueuePlanner, dt_us: int = 1000) -> np.ndarray:
+    pts = []
+    time = 1000
+    while len(planner.queue) > 0:
+        pts.extend(planner.on_new_control_points(time + dt_us * np.arange(10)))
+        time += dt_us * 10
+    return np.array(pts)
+
+
+# a budgeted replan that leaves the tail of the queue for later, followed by an offline path,
+# which replans mustn't run into once the budget is lifted
+def test_offline_path_after_pending_budgeted_replan():
+    planner = make_planner()
+    planner.replan_budget_us = 0
+    # (a smooth curve, where nothing settles before the budget runs out)
+    angles = np.linspace(0, 6, 60)
+    curve = np.stack([30 + 20 * np.cos(angles), 30 + 20 * np.sin(angles), np.zeros_like(angles)], axis = -1)
+    path = np.array([[60, 60, 0], [10, 50, 0], [40, 5, 0]], dtype = np.float64)
+
+    async def queue_moves():
+        await planner.goto_many(curve[:30], 200)
+        for position in curve[30:]:
+            await planner.goto_via_queue(position, 200)
+        assert planner._replan_pending
+        await planner.goto_offline(path, 200)
+
+    asyncio.run(queue_moves())
+    assert isinstance(planner.queue[-1], MAXLPlannedPath)
+    planner.replan_budget_us = None
+
+    pts = render(planner)
+    np.testing.assert_allclose(pts[-1], path[-1], atol = 1e-9)
+    # no jumps, at 200mm/s we cover ~ 0.2mm per ms, (plus a hair for segments starting on whole us)
+    assert np.max(np.linalg.norm(np.diff(pts, axis = 0), axis = 1)) < 0.2 * 1.01
+
+
+# halting wakes anyone already waiting on the queue to flush, (and works before we've rendered a thing)
+def test_halt_releases_concurrent_flush():
+    async def run(render_first: bool):
+        planner = make_planner()
+        await planner.goto_via_queue([10, 0, 0], 100)
+
+        async def tick():
+            time = 1000
+            while True:
+                planner.on_new_control_points(time + 1000 * np.arange(10))
+                time += 10000
+                await asyncio.sleep(0)
+
+        flush = asyncio.create_task(planner.flush_queue())
+        await asyncio.sleep(0)
+        if render_first:
+            ticker = asyncio.create_task(tick())
+            await asyncio.sleep(0)
+            await asyncio.sleep(0)
+            halt = asyncio.create_task(planner.halt())
+        else:
+            halt = asyncio.create_task(planner.halt())
+            ticker = asyncio.create_task(tick())
+        position = await asyncio.wait_for(halt, 2)
+        await asyncio.wait_for(flush, 2)
+        ticker.cancel()
+        return position
+
+    assert asyncio.run(run(True))[0] > 0
+    np.testing.assert_allclose(asyncio.run(run(False)), [0, 0, 0])